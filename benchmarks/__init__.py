@@ -0,0 +1 @@
+"""Benchmarks de las etapas de cálculo del dashboard sobre datos sintéticos."""
@@ -0,0 +1,69 @@
+"""Ejecuta las etapas del dashboard sobre datos sintéticos y reporta tiempo y memoria.
+
+Uso::
+
+    python -m benchmarks                       # 10k y 1M filas
+    python -m benchmarks --tamanos 10000 1000000 10000000 --json resultados.json
+
+Para cada tamaño y etapa se informa la mejor de ``--repeticiones`` mediciones
+de tiempo y el pico de memoria asignada (``tracemalloc``, en una corrida
+aparte para no distorsionar el tiempo).
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.etapas import ETAPAS, PREPARACION
+from dashboard.sinteticos import generar_ventas
+
+TAMANOS = [10_000, 1_000_000]
+
+
+def medir(etapa, contexto, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = etapa(contexto)
+        tiempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    etapa(contexto)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, min(tiempos), pico
+
+
+def ejecutar(tamanos, repeticiones, etapas=None):
+    resultados = []
+    for n_filas in tamanos:
+        contexto = {'datos': generar_ventas(n_filas)}
+        for nombre, etapa in ETAPAS.items():
+            if etapas and nombre not in etapas:
+                # Se ejecuta sin medir porque otras etapas pueden necesitar su resultado.
+                contexto[nombre] = etapa(contexto) if nombre not in PREPARACION else None
+                continue
+            if nombre in PREPARACION:
+                PREPARACION[nombre](contexto)
+            contexto[nombre], segundos, pico = medir(etapa, contexto, repeticiones)
+            resultados.append({'filas': n_filas, 'etapa': nombre,
+                               'segundos': segundos, 'pico_mb': pico / 2 ** 20})
+            print(f'{n_filas:>10,} {nombre:<18} {segundos * 1000:>10.1f} ms {pico / 2 ** 20:>10.1f} MB',
+                  flush=True)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--etapas', nargs='+', help='medir solo estas etapas')
+    parser.add_argument('--json', help='guardar los resultados en este archivo')
+    argumentos = parser.parse_args()
+    resultados = ejecutar(argumentos.tamanos, argumentos.repeticiones, argumentos.etapas)
+    if argumentos.json:
+        with open(argumentos.json, 'w') as archivo:
+            json.dump(resultados, archivo, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""Prueba de carga: sesiones concurrentes del dashboard ejecutadas con ``AppTest``.
+
+Uso::
+
+    python -m benchmarks.carga_concurrente                     # CSV local, 8 sesiones
+    python -m benchmarks.carga_concurrente --sesiones 1 4 16 --filas 1000000 --json carga.json
+
+Cada sesión es un ``AppTest`` de ``streamlit_app.py`` en su propio hilo, como
+las sesiones reales que comparten un proceso de Streamlit (y sus cachés).
+Cada sesión repite un guion de interacciones: cambiar ``agrupacion_tiempo``,
+acotar fechas, departamentos, ciudades y subgrupos, cambiar de moneda, abrir
+el análisis de clientes y restablecer los filtros.
+Se informa la latencia p50/p95/p99 de cada re-ejecución, el rendimiento
+(re-ejecuciones por segundo) y la memoria residente del proceso.
+
+Todo corre sin red (``VENTAS_OFFLINE=1``) sobre el CSV local o, con
+``--filas``, sobre ventas sintéticas escritas en un Parquet temporal. Las
+variables se fijan antes de la primera ejecución del script, que es cuando se
+importa :mod:`dashboard.carga`.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from dashboard.instrumentacion import rss_mb
+
+APP = Path(__file__).resolve().parent.parent / 'streamlit_app.py'
+SESIONES = [8]
+AGRUPACIONES = ['Dia', 'Semanal', 'Mensual', 'Trimestral', 'Anual']
+
+# Guiones de interacción; cada sesión usa uno (por turnos) y lo repite.
+GUIONES = {
+    'explorar_tiempo': ['agrupacion', 'agrupacion', 'fechas', 'agrupacion', 'restablecer'],
+    'acotar_geografia': ['clientes', 'departamentos', 'ciudades', 'agrupacion', 'subgrupos', 'restablecer'],
+    'mixto': ['subgrupos', 'agrupacion', 'moneda', 'clientes', 'departamentos', 'fechas', 'ciudades',
+              'restablecer'],
+}
+
+
+def _widget(elementos, prefijo):
+    return next(e for e in elementos if e.key and e.key.startswith(prefijo))
+
+
+def _acotar(multiselect, azar):
+    # Siempre queda al menos un valor: con la selección vacía el script se detiene.
+    opciones = list(multiselect.options)
+    return multiselect.set_value(azar.sample(opciones, azar.randint(1, max(1, len(opciones) // 2))))
+
+
+def _moneda(at, azar):
+    # Alterna entre pesos y dólares (las opciones del radio son etiquetas, no códigos).
+    radio = next(r for r in at.radio if r.key == 'moneda')
+    return radio.set_value('USD' if radio.value == 'COP' else 'COP')
+
+
+def _fechas(at, azar):
+    # Mueve la fecha inicial hacia adelante, hasta la mitad del rango actual.
+    inicio = _widget(at.date_input, 'fecha_inicio_')
+    final = _widget(at.date_input, 'fecha_fin_')
+    return inicio.set_value(inicio.value + (final.value - inicio.value) * azar.uniform(0, 0.5))
+
+
+ACCIONES = {
+    'agrupacion': lambda at, azar: _widget(at.radio, 'agrupacion_').set_value(azar.choice(AGRUPACIONES)),
+    'departamentos': lambda at, azar: _acotar(_widget(at.multiselect, 'departamento_'), azar),
+    'ciudades': lambda at, azar: _acotar(_widget(at.multiselect, 'ciudad_'), azar),
+    'subgrupos': lambda at, azar: _acotar(_widget(at.multiselect, 'subgrupo_'), azar),
+    'fechas': _fechas,
+    'moneda': _moneda,
+    # Abre (o vuelve a cerrar) el análisis de clientes, que no se calcula hasta abrirlo.
+    'clientes': lambda at, azar: _widget(at.toggle, 'mostrar_clientes').set_value(
+        not _widget(at.toggle, 'mostrar_clientes').value),
+    'restablecer': lambda at, azar: next(b for b in at.button if 'Restablecer' in b.label).click(),
+}
+
+
+def sesion(numero, guion, ciclos, pausa, timeout, semilla):
+    """Ejecuta ``guion`` ``ciclos`` veces en una sesión nueva; devuelve sus mediciones."""
+    from streamlit.testing.v1 import AppTest
+
+    azar = random.Random(semilla + numero)
+    at = AppTest.from_file(str(APP), default_timeout=timeout)
+    mediciones = []
+
+    def ejecutar(accion, widget):
+        inicio = time.perf_counter()
+        (at if widget is None else widget).run()
+        mediciones.append({'sesion': numero, 'accion': accion, 'segundos': time.perf_counter() - inicio,
+                           'error': str(at.exception[0].value) if len(at.exception) else None})
+
+    ejecutar('inicio', None)
+    for _ in range(ciclos):
+        for accion in guion:
+            if pausa:
+                time.sleep(azar.uniform(0, pausa))
+            try:
+                widget = ACCIONES[accion](at, azar)
+            except StopIteration:
+                # El widget no está en la página (el script falló antes): se vuelve a ejecutar.
+                accion, widget = 'reintento', None
+            ejecutar(accion, widget)
+    return mediciones
+
+
+@contextlib.contextmanager
+def _compilar_una_vez():
+    """Comparte el bytecode del script entre todas las sesiones de la prueba.
+
+    El servidor compila el script una sola vez, pero ``AppTest`` lo vuelve a
+    compilar en cada ejecución, y ``ast.parse`` no es seguro entre hilos en
+    Python 3.11.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    original = ScriptCache.get_bytecode
+    compilados = {}
+    lock = threading.Lock()
+
+    def get_bytecode(cache, ruta):
+        with lock:
+            if ruta not in compilados:
+                compilados[ruta] = original(cache, ruta)
+            return compilados[ruta]
+
+    with mock.patch.object(ScriptCache, 'get_bytecode', get_bytecode):
+        yield
+
+
+class _MonitorMemoria(threading.Thread):
+    """Muestrea la memoria residente del proceso mientras corre la prueba."""
+
+    def __init__(self, intervalo=0.2):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.maximo = rss_mb() or 0.0
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.maximo = max(self.maximo, rss_mb() or 0.0)
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+def _resumen(segundos):
+    p50, p95, p99 = np.percentile(segundos, [50, 95, 99]) if len(segundos) else (np.nan,) * 3
+    return {'n': len(segundos), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def prueba(n_sesiones, ciclos=3, pausa=0.0, timeout=300, semilla=0):
+    """Corre ``n_sesiones`` sesiones a la vez y resume latencias, rendimiento y memoria."""
+    from streamlit.testing.v1.util import patch_config_options
+
+    guiones = list(GUIONES.items())
+    rss_inicial = rss_mb()
+    monitor = _MonitorMemoria()
+    monitor.start()
+    inicio = time.perf_counter()
+    # Cada AppTest.run() activa global.appTest y al terminar restaura el valor
+    # anterior; con sesiones simultáneas se mantiene activo durante toda la prueba.
+    with patch_config_options({'global.appTest': True}), _compilar_una_vez():
+        with ThreadPoolExecutor(max_workers=n_sesiones) as pool:
+            futuros = [pool.submit(sesion, numero, guiones[numero % len(guiones)][1], ciclos, pausa, timeout,
+                                   semilla)
+                       for numero in range(n_sesiones)]
+            mediciones = [medicion for futuro in futuros for medicion in futuro.result()]
+    duracion = time.perf_counter() - inicio
+    monitor.detener()
+
+    # La primera ejecución de cada sesión se informa aparte: incluye la carga inicial.
+    reejecuciones = [m for m in mediciones if m['accion'] != 'inicio']
+    acciones = sorted({m['accion'] for m in mediciones})
+    errores = [m['error'] for m in mediciones if m['error']]
+    return {
+        'sesiones': n_sesiones,
+        'duracion_segundos': duracion,
+        'reejecuciones_por_segundo': len(reejecuciones) / duracion,
+        'latencia': _resumen([m['segundos'] for m in reejecuciones]),
+        'por_accion': {a: _resumen([m['segundos'] for m in mediciones if m['accion'] == a]) for a in acciones},
+        'rss_inicial_mb': rss_inicial,
+        'rss_maximo_mb': monitor.maximo,
+        'rss_final_mb': rss_mb(),
+        'errores': len(errores),
+        'primer_error': errores[0] if errores else None,
+    }
+
+
+def _imprimir(resultado):
+    print(f"\n{resultado['sesiones']} sesiones · {resultado['latencia']['n']} re-ejecuciones en "
+          f"{resultado['duracion_segundos']:.1f} s · {resultado['reejecuciones_por_segundo']:.2f} por segundo")
+    print(f"{'acción':<16} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for nombre, resumen in [*resultado['por_accion'].items(), ('total', resultado['latencia'])]:
+        print(f"{nombre:<16} {resumen['n']:>5} {resumen['p50'] * 1000:>10.1f} "
+              f"{resumen['p95'] * 1000:>10.1f} {resumen['p99'] * 1000:>10.1f}")
+    print(f"RSS: {resultado['rss_inicial_mb']:,.0f} MB al inicio, {resultado['rss_maximo_mb']:,.0f} MB máximo, "
+          f"{resultado['rss_final_mb']:,.0f} MB al final")
+    if resultado['errores']:
+        print(f"{resultado['errores']} ejecuciones con excepción; primera: {resultado['primer_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sesiones', type=int, nargs='+', default=SESIONES,
+                        help='sesiones concurrentes (una prueba por valor)')
+    parser.add_argument('--ciclos', type=int, default=3, help='repeticiones del guion por sesión')
+    parser.add_argument('--pausa', type=float, default=0.0,
+                        help='pausa aleatoria máxima entre interacciones, en segundos')
+    parser.add_argument('--filas', type=int, help='usar ventas sintéticas de este tamaño en vez del CSV local')
+    parser.add_argument('--timeout', type=float, default=300, help='tiempo máximo de una ejecución del script')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--json', help='guardar los resultados en este archivo')
+    argumentos = parser.parse_args()
+
+    os.environ['VENTAS_OFFLINE'] = '1'
+    with tempfile.TemporaryDirectory() as directorio:
+        if argumentos.filas:
+            from dashboard.sinteticos import generar_ventas
+
+            ruta = Path(directorio) / 'ventas_sinteticas.parquet'
+            generar_ventas(argumentos.filas, semilla=argumentos.semilla).to_parquet(ruta, index=False)
+            os.environ['VENTAS_CSV_LOCAL'] = str(ruta)
+        resultados = []
+        for n_sesiones in argumentos.sesiones:
+            resultado = prueba(n_sesiones, argumentos.ciclos, argumentos.pausa, argumentos.timeout,
+                               argumentos.semilla)
+            _imprimir(resultado)
+            resultados.append(resultado)
+    if argumentos.json:
+        with open(argumentos.json, 'w') as archivo:
+            json.dump(resultados, archivo, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Etapas medidas por el benchmark.
+
+Cada etapa es una función ``etapa(contexto)`` que recibe un diccionario con
+los resultados de las etapas anteriores y devuelve su propio resultado, que
+queda en ``contexto[nombre]``. El orden de ``ETAPAS`` es el del script de
+Streamlit. ``PREPARACION`` tiene el trabajo previo de una etapa que no debe
+contarse en su medición.
+"""
+import io
+
+import pandas as pd
+
+from dashboard.almacenamiento import leer_csv
+from dashboard.clientes import metricas_rfm
+from dashboard.cubo import MEDIDAS, construir_cubo, serie_temporal, totales_por
+from dashboard.figuras import (figura_evolucion, figura_pareto_clientes, figura_top_productos,
+                               figura_top_subgrupos)
+from dashboard.filtros import IndiceFiltros
+from dashboard.indicadores import indicadores_clave
+from dashboard.monedas import medida_en, tabla_trm
+from dashboard.paralelo import construir_cubo_paralelo
+from dashboard.pareto import AnalisisPareto
+from dashboard.prefijos import IndicePrefijos
+from dashboard.pronostico import Pronosticos
+
+# El CSV se serializa en memoria, así que solo se mide hasta este tamaño.
+MAX_FILAS_CSV = 1_000_000
+
+
+def _seleccion_acotada(df):
+    # Un filtro típico: la mitad de los departamentos y el último año.
+    departamentos = df['departamento'].cat.categories[::2].tolist()
+    return ({'departamento': departamentos,
+             'ciudad': df['ciudad'].cat.categories.tolist(),
+             'nom_sub': df['nom_sub'].cat.categories.tolist()},
+            df['fecha'].max() - pd.Timedelta(days=365), df['fecha'].max())
+
+
+def preparar_csv(contexto):
+    df = contexto['datos']
+    contexto['csv'] = df.to_csv(index=False).encode() if len(df) <= MAX_FILAS_CSV else None
+
+
+def leer_csv_etapa(contexto):
+    if contexto['csv'] is None:
+        return None
+    return leer_csv(io.BytesIO(contexto['csv']))
+
+
+def cubo(contexto):
+    return construir_cubo(contexto['datos'])
+
+
+def cubo_paralelo(contexto):
+    # Mismo cubo repartido por meses en un pool de procesos (sin umbral de filas).
+    return construir_cubo_paralelo(contexto['datos'], min_filas=0)
+
+
+def indice(contexto):
+    return IndiceFiltros(contexto['datos'])
+
+
+def indice_cubo(contexto):
+    return IndiceFiltros(contexto['cubo'])
+
+
+def prefijos(contexto):
+    return IndicePrefijos(contexto['cubo'])
+
+
+def conversion(contexto):
+    # Ventas del cubo en dólares con la TRM de cada día (join as-of sobre fecha).
+    cubo = contexto['cubo']
+    return tabla_trm().convertir(cubo['pre_tot'], cubo['fecha'], 'USD')
+
+
+def filtro_todo(contexto):
+    df = contexto['datos']
+    seleccion = {dimension: df[dimension].cat.categories.tolist()
+                 for dimension in ('departamento', 'ciudad', 'nom_sub')}
+    return contexto['indice'].filtrar(seleccion)
+
+
+def filtro_acotado(contexto):
+    seleccion, inicio, fin = _seleccion_acotada(contexto['datos'])
+    return contexto['indice'].filtrar(seleccion, inicio, fin)
+
+
+def filtro_mascara(contexto):
+    # Referencia: la máscara booleana original sobre todas las filas.
+    df = contexto['datos']
+    seleccion, inicio, fin = _seleccion_acotada(df)
+    return df[
+        df['departamento'].isin(seleccion['departamento']) &
+        df['ciudad'].isin(seleccion['ciudad']) &
+        df['nom_sub'].isin(seleccion['nom_sub']) &
+        (df['fecha'] >= inicio) & (df['fecha'] <= fin)
+    ]
+
+
+def cubo_acotado(contexto):
+    seleccion, inicio, fin = _seleccion_acotada(contexto['datos'])
+    return contexto['indice_cubo'].filtrar(seleccion, inicio, fin)
+
+
+def totales_acotados(contexto):
+    # Totales del filtro típico con sumas acumuladas (cubo_acotado es la referencia).
+    return contexto['prefijos'].totales(*_seleccion_acotada(contexto['datos']))
+
+
+def indicadores(contexto):
+    totales = {**contexto['cubo'][MEDIDAS].sum(), medida_en('USD'): contexto['conversion'].sum()}
+    return indicadores_clave(totales, contexto['filtro_todo'])
+
+
+def series_temporales(contexto):
+    return {agrupacion: serie_temporal(contexto['cubo'], agrupacion)
+            for agrupacion in ('Dia', 'Semanal', 'Mensual', 'Trimestral', 'Anual')}
+
+
+def totales(contexto):
+    return (totales_por(contexto['cubo'], ['nom_sub']).sort_values('pre_tot'),
+            totales_por(contexto['cubo'], ['nom_sub', 'des_item']).sort_values('pre_tot'))
+
+
+def pareto(contexto):
+    subgrupos, productos = contexto['totales']
+    return AnalisisPareto(subgrupos), AnalisisPareto(productos)
+
+
+def clientes(contexto):
+    return AnalisisPareto(metricas_rfm(contexto['filtro_todo']), valor='ventas_totales')
+
+
+def pronostico(contexto):
+    # Se ejecuta en segundo plano en la app; aquí se mide el ajuste completo.
+    return Pronosticos.desde_ventas(contexto['datos'])
+
+
+def figuras(contexto):
+    subgrupos, productos = contexto['totales']
+    pareto_clientes = contexto['clientes']
+    return (figura_evolucion(contexto['series_temporales']['Mensual'], 'Mensual'),
+            figura_top_subgrupos(subgrupos),
+            figura_top_productos(productos),
+            figura_pareto_clientes(pareto_clientes.tabla, pareto_clientes.cantidad_hasta(30)))
+
+
+def serializacion(contexto):
+    return [figura.to_json() for figura in contexto['figuras']]
+
+
+ETAPAS = {
+    'leer_csv': leer_csv_etapa,
+    'cubo': cubo,
+    'cubo_paralelo': cubo_paralelo,
+    'indice': indice,
+    'indice_cubo': indice_cubo,
+    'prefijos': prefijos,
+    'conversion': conversion,
+    'filtro_todo': filtro_todo,
+    'filtro_acotado': filtro_acotado,
+    'filtro_mascara': filtro_mascara,
+    'cubo_acotado': cubo_acotado,
+    'totales_acotados': totales_acotados,
+    'indicadores': indicadores,
+    'series_temporales': series_temporales,
+    'totales': totales,
+    'pareto': pareto,
+    'clientes': clientes,
+    'pronostico': pronostico,
+    'figuras': figuras,
+    'serializacion': serializacion,
+}
+
+PREPARACION = {
+    'leer_csv': preparar_csv,
+}
@@ -0,0 +1 @@
+"""Lógica de datos del dashboard de ventas, separada de la página de Streamlit."""
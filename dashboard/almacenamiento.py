@@ -0,0 +1,134 @@
+"""Formato columnar tipado (Parquet/Arrow) para las ventas.
+
+Las dimensiones se guardan con codificación de diccionario (categorías en
+pandas), ``fecha`` como datetime64 y los códigos numéricos con el entero más
+pequeño que los contiene. Las medidas monetarias se mantienen en float64 para
+no perder precisión en las sumas. ``año`` y ``mes`` se descartan porque se
+derivan de ``fecha``, y ``TRM`` y ``pre_tot_US`` porque se calculan con la
+tabla diaria de :mod:`dashboard.monedas`.
+
+Conversión desde la línea de comandos::
+
+    python -m dashboard.almacenamiento ventas_industria_quimica.csv ventas.parquet
+"""
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DIMENSIONES = ['departamento', 'ciudad', 'nom_sub', 'nom_cco', 'nom_ven', 'nom_cli',
+               'des_item', 'cliente', 'item']
+
+_DICCIONARIO = pa.dictionary(pa.int32(), pa.string())
+
+ESQUEMA = pa.schema([
+    ('vendedor', pa.int16()),
+    ('nom_ven', _DICCIONARIO),
+    ('num_doc', pa.string()),
+    ('fecha', pa.timestamp('ns')),
+    ('dia_pla', pa.int16()),
+    ('item', _DICCIONARIO),
+    ('des_item', _DICCIONARIO),
+    ('cantidad', pa.float64()),
+    ('pre_tot', pa.float64()),
+    ('cliente', _DICCIONARIO),
+    ('nom_cli', _DICCIONARIO),
+    ('cod_subgrupo', pa.int16()),
+    ('nom_sub', _DICCIONARIO),
+    ('cod_dep', pa.float32()),
+    ('departamento', _DICCIONARIO),
+    ('cod_ciu', pa.int32()),
+    ('ciudad', _DICCIONARIO),
+    ('cod_cco', pa.int16()),
+    ('nom_cco', _DICCIONARIO),
+])
+
+# Columnas que usa la página; el resto no se lee.
+COLUMNAS_DASHBOARD = ['fecha', 'num_doc', 'item', 'des_item', 'cantidad', 'pre_tot',
+                      'cliente', 'nom_cli', 'nom_sub', 'cod_dep', 'departamento',
+                      'cod_ciu', 'ciudad']
+
+# Tipos para leer el CSV sin inferencia.
+TIPOS_CSV = {
+    'num_doc': 'string',
+    'cantidad': 'float64',
+    'pre_tot': 'float64',
+    **{columna: 'category' for columna in DIMENSIONES},
+}
+
+_ENTEROS = ['vendedor', 'dia_pla', 'cod_subgrupo', 'cod_ciu', 'cod_cco']
+
+# Columnas del export que se derivan de otras y no se guardan.
+DERIVADAS = ['año', 'mes', 'TRM', 'pre_tot_US']
+
+
+def tipar_ventas(df, conservar=()):
+    """Aplica el esquema a un DataFrame de ventas leído de CSV (sin copiar lo ya tipado).
+
+    Descarta las columnas ``DERIVADAS`` que no estén en ``conservar``.
+    """
+    df = df.drop(columns=[columna for columna in DERIVADAS if columna not in conservar], errors='ignore')
+    if not pd.api.types.is_datetime64_any_dtype(df['fecha']):
+        df['fecha'] = pd.to_datetime(df['fecha'])
+    for columna in DIMENSIONES:
+        if columna in df and not isinstance(df[columna].dtype, pd.CategoricalDtype):
+            # Los faltantes siguen siendo nulos, como al leer el CSV; los códigos numéricos pasan a texto.
+            df[columna] = df[columna].astype('category')
+            if not pd.api.types.is_object_dtype(df[columna].cat.categories):
+                df[columna] = df[columna].cat.rename_categories(str)
+    for columna in _ENTEROS:
+        if columna in df:
+            df[columna] = pd.to_numeric(df[columna], downcast='integer')
+    if 'cod_dep' in df:
+        df['cod_dep'] = df['cod_dep'].astype('float32')
+    return df
+
+
+def _ordenar_y_tipar(df, columnas):
+    if columnas is not None:
+        df = df[list(columnas)]
+    # Una columna derivada pedida explícitamente se conserva.
+    return tipar_ventas(df, conservar=columnas or ())
+
+
+def leer_csv(origen, columnas=COLUMNAS_DASHBOARD, chunksize=None, **kwargs):
+    """Lee un CSV de ventas ya tipado. ``columnas=None`` lee todas.
+
+    Con ``chunksize`` devuelve un iterador de bloques tipados.
+    """
+    lector = pd.read_csv(origen, usecols=columnas, parse_dates=['fecha'],
+                         dtype={c: t for c, t in TIPOS_CSV.items() if columnas is None or c in columnas},
+                         chunksize=chunksize, **kwargs)
+    if chunksize is None:
+        return _ordenar_y_tipar(lector, columnas)
+    return (_ordenar_y_tipar(bloque, columnas) for bloque in lector)
+
+
+def _esquema_de(columnas):
+    return pa.schema([ESQUEMA.field(columna) for columna in columnas])
+
+
+def escribir_parquet(df, destino, **kwargs):
+    """Guarda un DataFrame de ventas con el esquema explícito."""
+    df = tipar_ventas(df)
+    columnas = [campo.name for campo in ESQUEMA if campo.name in df]
+    tabla = pa.Table.from_pandas(df[columnas], schema=_esquema_de(columnas),
+                                 preserve_index=False)
+    pq.write_table(tabla, destino, **kwargs)
+
+
+def convertir_a_parquet(origen_csv, destino):
+    """Convierte el CSV exportado del ERP al formato columnar."""
+    escribir_parquet(leer_csv(origen_csv, columnas=None), destino)
+
+
+def leer_parquet(origen, columnas=COLUMNAS_DASHBOARD, **kwargs):
+    """Lee solo ``columnas`` del Parquet; las dimensiones llegan como categorías."""
+    return pq.read_table(origen, columns=columnas, **kwargs).to_pandas()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('uso: python -m dashboard.almacenamiento ORIGEN.csv DESTINO.parquet')
+    convertir_a_parquet(sys.argv[1], sys.argv[2])
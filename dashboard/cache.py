@@ -0,0 +1,114 @@
+"""Caché LRU en memoria con presupuesto de bytes y contadores de aciertos y fallos.
+
+Las cachés del dashboard son del proceso (se crean con
+:func:`dashboard.carga.derivado`), así que todas las sesiones comparten los
+resultados de una misma selección. Con ``max_bytes`` se descartan las entradas
+menos usadas hasta que el tamaño estimado de lo guardado quepa en el
+presupuesto, y la memoria no crece con la cantidad de usuarios.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Presupuestos por defecto (en MB) de las cachés de resultados y de figuras.
+MB_RESULTADOS = float(os.environ.get('DASHBOARD_CACHE_MB', 256))
+MB_FIGURAS = float(os.environ.get('DASHBOARD_CACHE_FIGURAS_MB', 64))
+
+
+def tamano_en_bytes(valor, _vistos=None):
+    """Estimación del tamaño en memoria de ``valor`` (DataFrames, arrays, figuras, objetos...)."""
+    vistos = set() if _vistos is None else _vistos
+    if id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    if isinstance(valor, (pd.DataFrame, pd.Series, pd.Index)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum() if isinstance(valor, pd.DataFrame) else uso)
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if hasattr(valor, 'to_plotly_json'):
+        # Figuras de plotly: sus trazas y layout como diccionarios y arrays.
+        return tamano_en_bytes(valor.to_plotly_json(), vistos)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamano_en_bytes(k, vistos) + tamano_en_bytes(v, vistos)
+                                          for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(tamano_en_bytes(v, vistos) for v in valor)
+    if hasattr(valor, '__dict__'):
+        return sys.getsizeof(valor) + tamano_en_bytes(vars(valor), vistos)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """Guarda hasta ``max_entradas`` resultados (y ``max_bytes``) y descarta el menos usado.
+
+    ``tamano`` estima los bytes de cada valor; solo se usa con ``max_bytes``.
+    Un valor que por sí solo supera el presupuesto se devuelve sin guardarlo.
+    """
+
+    def __init__(self, max_entradas=32, max_bytes=None, tamano=tamano_en_bytes):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.tamano = tamano
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.bytes = 0
+        self._entradas = OrderedDict()
+        self._tamanos = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
+
+    def obtener(self, clave, construir):
+        """Devuelve el valor de ``clave``; si no está, lo calcula con ``construir()``."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+            self.fallos += 1
+        # Se construye (y se mide) fuera del lock para no bloquear a otras sesiones.
+        valor = construir()
+        tamano = self.tamano(valor) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and tamano > self.max_bytes:
+            return valor
+        with self._lock:
+            if clave in self._entradas:
+                self.bytes -= self._tamanos[clave]
+            self._entradas[clave] = valor
+            self._tamanos[clave] = tamano
+            self.bytes += tamano
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes):
+                descartada, _ = self._entradas.popitem(last=False)
+                self.bytes -= self._tamanos.pop(descartada)
+                self.desalojos += 1
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._tamanos.clear()
+            self.bytes = 0
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._entradas),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+        }
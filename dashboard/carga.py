@@ -0,0 +1,344 @@
+"""Carga de las ventas con caché por proceso y respaldo local sin conexión.
+
+El DataFrame se descarga y se parsea una sola vez por proceso. Pasado el TTL
+se revalida contra el servidor con ``If-None-Match``/``If-Modified-Since``;
+si el contenido no cambió (304 o misma huella SHA-256) se reutiliza el
+DataFrame ya parseado. La revalidación corre en un hilo aparte y, mientras
+tanto, todas las sesiones siguen recibiendo la copia vigente; solo la primera
+carga, que no tiene nada que servir, se espera. Si la red no está disponible se usa el archivo local,
+que puede ser el CSV original, su versión Parquet o el directorio de un
+:class:`dashboard.incremental.AlmacenVentas`.
+
+Con un almacén, una versión nueva se arma añadiendo a la tabla en memoria
+solo las particiones que faltan, y el cubo diario del motor sale de sus
+agregados en vez de recalcularse. Los CSV se leen por bloques con
+:func:`dashboard.ingesta.leer_para_dashboard`, que pliega el cubo de cada
+bloque. En ambos casos el motor toma ese cubo de :func:`cubo_cargado`. La
+descarga se copia por bloques a un archivo temporal mientras se calcula su
+huella: el texto del CSV nunca está entero en memoria.
+
+Si el CSV trae la columna ``TRM``, sus tasas reemplazan a la tabla diaria
+estática y se guardan en la instantánea (:func:`trm_de`).
+
+La tabla ya tipada se guarda en una :class:`dashboard.instantanea.Instantanea`
+con la huella de su origen: tras reiniciar el proceso se lee de ahí (con
+``memory_map``) en vez de volver a parsear, y la URL se revalida con los
+validadores HTTP de la última descarga.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from dashboard.almacenamiento import leer_parquet
+from dashboard.incremental import AlmacenVentas
+from dashboard.ingesta import _concatenar, leer_para_dashboard
+from dashboard.instantanea import Instantanea, registrar_descarga, ultima_descarga
+from dashboard.monedas import TablaTRM, tabla_trm
+
+URL_VENTAS = os.environ.get(
+    'VENTAS_URL',
+    'https://drive.google.com/uc?export=download&id=1ovtCh5Q45nukxt9HILW3qzwTCmgSqNW2',
+)
+RUTA_LOCAL = Path(os.environ.get(
+    'VENTAS_CSV_LOCAL',
+    Path(__file__).resolve().parent.parent / 'ventas_industria_quimica.csv',
+))
+TTL_SEGUNDOS = float(os.environ.get('VENTAS_TTL', 600))
+TIMEOUT_RED = float(os.environ.get('VENTAS_TIMEOUT', 10))
+# Con VENTAS_OFFLINE=1 nunca se intenta la descarga.
+SIN_CONEXION = os.environ.get('VENTAS_OFFLINE', '') not in ('', '0')
+# Bytes que se leen de una vez al descargar o al calcular la huella.
+TAM_BLOQUE_LECTURA = 1 << 20
+
+
+class _Entrada:
+    def __init__(self, df, huella, origen, etag=None, modificado=None):
+        self.df = df
+        self.huella = huella
+        self.origen = origen
+        self.etag = etag
+        self.modificado = modificado
+        # Particiones leídas, si el origen es un almacén incremental.
+        self.particiones = None
+        # Error de la última revalidación fallida (se siguió sirviendo esta copia).
+        self.error = None
+        self.validado_en = time.monotonic()
+
+
+_cache = {}
+_lock = threading.Lock()
+# Revalidaciones en curso por clave y un lock por clave para la primera carga.
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='revalidacion')
+_revalidando = {}
+_locks_carga = {}
+
+# Todas las sesiones leen el mismo DataFrame: con copy-on-write las selecciones
+# y vistas que cada una derive no lo copian, y modificarlas nunca lo altera.
+pd.set_option('mode.copy_on_write', True)
+
+
+def _parsear(archivo, origen, huella):
+    # ``archivo`` es la ruta local o el temporal de la descarga.
+    cubo = trm = None
+    if str(origen).endswith('.parquet'):
+        df = leer_parquet(archivo)
+    else:
+        df, cubo, trm = leer_para_dashboard(archivo)
+    # Ordenado por fecha para que los filtros resuelvan el rango por búsqueda binaria.
+    df = df.sort_values('fecha', kind='stable', ignore_index=True)
+    if trm is not None:
+        Instantanea(huella).tabla('trm', lambda: trm.tasas)
+        derivado(df, 'trm', lambda _: trm)
+    return _con_cubo(df, lambda: cubo)
+
+
+def _con_cubo(df, cubo):
+    # ``cubo()`` es el cubo diario de ``df`` que ya tiene la carga; se registra para el motor.
+    valor = cubo()
+    if valor is not None:
+        derivado(df, 'cubo_cargado', lambda _: valor)
+    return df
+
+
+def _copiar(origen, destino=None):
+    # Lee ``origen`` por bloques, copiándolo en ``destino``, y devuelve su huella SHA-256.
+    huella = hashlib.sha256()
+    while bloque := origen.read(TAM_BLOQUE_LECTURA):
+        huella.update(bloque)
+        if destino is not None:
+            destino.write(bloque)
+    return huella.hexdigest()
+
+
+def _huella(ruta):
+    with open(ruta, 'rb') as archivo:
+        return _copiar(archivo)
+
+
+def _descargar(url, entrada):
+    """Devuelve ``(archivo, huella, etag, modificado)`` o ``None`` si el servidor responde 304.
+
+    ``archivo`` es un temporal con el contenido, que se borra al cerrarlo.
+    """
+    peticion = urllib.request.Request(url)
+    if entrada is not None and entrada.origen == url:
+        if entrada.etag:
+            peticion.add_header('If-None-Match', entrada.etag)
+        if entrada.modificado:
+            peticion.add_header('If-Modified-Since', entrada.modificado)
+    try:
+        with urllib.request.urlopen(peticion, timeout=TIMEOUT_RED) as respuesta:
+            archivo = tempfile.TemporaryFile()
+            try:
+                huella = _copiar(respuesta, archivo)
+            except BaseException:
+                archivo.close()
+                raise
+            archivo.seek(0)
+            return (archivo, huella,
+                    respuesta.headers.get('ETag'),
+                    respuesta.headers.get('Last-Modified'))
+    except urllib.error.HTTPError as error:
+        if error.code == 304:
+            return None
+        raise
+
+
+def _tabla(huella, construir):
+    # La tabla tipada de la instantánea de ``huella``, o ``construir()`` guardándola.
+    return Instantanea(huella).tabla('ventas', construir)
+
+
+def _nueva_entrada(archivo, huella, origen, entrada, etag=None, modificado=None):
+    if entrada is not None and entrada.huella == huella:
+        # Mismo contenido: se conserva el DataFrame ya parseado.
+        if entrada.df is None:
+            entrada.df = _tabla(huella, lambda: _parsear(archivo, origen, huella))
+        entrada.origen, entrada.etag, entrada.modificado = origen, etag, modificado
+        entrada.validado_en = time.monotonic()
+        return entrada
+    df = _tabla(huella, lambda: _parsear(archivo, origen, huella))
+    return _Entrada(df, huella, origen, etag, modificado)
+
+
+def _entrada_guardada(url):
+    # Tras reiniciar: la última descarga de ``url`` con instantánea, aún sin leer.
+    registro = ultima_descarga(url)
+    if registro is None:
+        return None
+    return _Entrada(None, registro['huella'], url, registro['etag'], registro['modificado'])
+
+
+def _revalidar(url, ruta_local, entrada):
+    if url and not SIN_CONEXION:
+        if entrada is None:
+            entrada = _entrada_guardada(url)
+        try:
+            descarga = _descargar(url, entrada)
+        except (urllib.error.URLError, OSError):
+            descarga = False
+        if descarga is None:
+            if entrada.df is None:
+                entrada.df = Instantanea(entrada.huella).leer_tabla('ventas')
+            entrada.validado_en = time.monotonic()
+            return entrada
+        if descarga is not False:
+            archivo, huella, etag, modificado = descarga
+            with archivo:
+                entrada = _nueva_entrada(archivo, huella, url, entrada, etag, modificado)
+            registrar_descarga(url, entrada.huella, etag, modificado)
+            return entrada
+    # Sin red: si ya hay datos (en memoria o de la última descarga) se siguen usando hasta el próximo TTL.
+    if entrada is not None and entrada.origen == url:
+        if entrada.df is None:
+            entrada.df = Instantanea(entrada.huella).leer_tabla('ventas')
+        entrada.validado_en = time.monotonic()
+        return entrada
+    if Path(ruta_local).is_dir():
+        return _entrada_almacen(ruta_local, entrada)
+    return _nueva_entrada(ruta_local, _huella(ruta_local), str(ruta_local), entrada)
+
+
+def _entrada_almacen(ruta_local, entrada):
+    # Un directorio es un AlmacenVentas; su versión cambia con cada carga incremental.
+    almacen = AlmacenVentas(ruta_local)
+    huella = almacen.version()
+    particiones = almacen.estado()['particiones']
+    previa = entrada if entrada is not None and entrada.origen == str(ruta_local) else None
+    if previa is not None and previa.df is not None and previa.particiones == particiones:
+        # Sin filas nuevas (p. ej. un archivo ya cargado): la misma tabla con otra huella.
+        previa.huella = huella
+        previa.validado_en = time.monotonic()
+        return previa
+    if previa is not None and previa.df is not None and previa.particiones is not None:
+        def leer():
+            nuevas = almacen.leer(desde=previa.particiones)
+            return (_concatenar([previa.df, nuevas])
+                    .sort_values('fecha', kind='stable', ignore_index=True))
+    else:
+        leer = almacen.leer
+    # El cubo del almacén se mantiene en cada carga: no se recalcula.
+    nueva = _Entrada(_tabla(huella, lambda: _con_cubo(leer(), almacen.cubo)), huella, str(ruta_local))
+    nueva.particiones = particiones
+    return nueva
+
+
+def cargar_ventas(url=URL_VENTAS, ruta_local=RUTA_LOCAL, ttl=TTL_SEGUNDOS):
+    """Devuelve el DataFrame de ventas compartido por todas las sesiones del proceso.
+
+    El resultado no debe modificarse en sitio: es el mismo objeto para todos
+    (las copias y vistas que se deriven de él son copy-on-write).
+    """
+    clave = (url, str(ruta_local))
+    with _lock:
+        entrada = _cache.get(clave)
+        if entrada is not None:
+            if time.monotonic() - entrada.validado_en >= ttl and clave not in _revalidando:
+                # Vencida: un solo hilo revalida y, mientras, se sirve la copia vigente.
+                _revalidando[clave] = _ejecutor.submit(_revalidar_en_segundo_plano, clave, entrada)
+            return entrada.df
+        lock_carga = _locks_carga.setdefault(clave, threading.Lock())
+    # Primera carga: sin copia que servir, las demás sesiones esperan a la que carga.
+    with lock_carga:
+        entrada = _cache.get(clave)
+        if entrada is None:
+            entrada = _publicar(clave, _revalidar(*clave, None))
+        return entrada.df
+
+
+def _publicar(clave, entrada):
+    derivado(entrada.df, 'huella', lambda _: entrada.huella)
+    with _lock:
+        _cache[clave] = entrada
+        _revalidando.pop(clave, None)
+    return entrada
+
+
+def _revalidar_en_segundo_plano(clave, entrada):
+    try:
+        nueva = _revalidar(*clave, entrada)
+        nueva.error = None
+    except Exception as error:
+        # Se sigue sirviendo la copia vigente y se reintenta pasado otro TTL.
+        nueva = entrada
+        nueva.error = f'{type(error).__name__}: {error}'
+        nueva.validado_en = time.monotonic()
+    return _publicar(clave, nueva)
+
+
+def estado_carga(url=URL_VENTAS, ruta_local=RUTA_LOCAL):
+    """Origen, huella y error de la última revalidación de los datos, o ``None`` si aún no se han cargado.
+
+    ``version`` es la :func:`version_de` del DataFrame que se está sirviendo;
+    puede diferir de ``huella`` si una revalidación cambió la huella sin
+    cambiar las filas.
+    """
+    entrada = _cache.get((url, str(ruta_local)))
+    if entrada is None:
+        return None
+    return {'origen': entrada.origen, 'huella': entrada.huella, 'error': entrada.error,
+            'version': version_de(entrada.df)}
+
+
+def version_de(df):
+    """Huella de los datos de ``df`` tal como los devolvió :func:`cargar_ventas`.
+
+    A diferencia de :func:`estado_carga`, no cambia si una revalidación
+    termina entre la carga y la consulta.
+    """
+    return derivado(df, 'huella', lambda _: None)
+
+
+def esperar_revalidacion(url=URL_VENTAS, ruta_local=RUTA_LOCAL):
+    """Espera a que termine la revalidación en curso, si la hay (para scripts y pruebas)."""
+    futuro = _revalidando.get((url, str(ruta_local)))
+    if futuro is not None:
+        futuro.result()
+
+
+def cubo_cargado(df):
+    """Cubo diario de ``df`` que la carga ya obtuvo (de sus bloques o del almacén), o ``None``."""
+    return derivado(df, 'cubo_cargado', lambda _: None)
+
+
+def trm_de(df, instantanea=None):
+    """:class:`TablaTRM` de ``df``: las tasas que traía su origen o, si no traía, la tabla diaria.
+
+    Tras reiniciar, las tasas del origen se leen de ``instantanea``.
+    """
+    def construir(_):
+        if instantanea is not None and instantanea.existe('trm'):
+            return TablaTRM(instantanea.leer_tabla('trm'))
+        return tabla_trm()
+    return derivado(df, 'trm', construir)
+
+
+_derivados = {}
+_lock_derivados = threading.RLock()
+
+
+def derivado(df, nombre, construir):
+    """Calcula ``construir(df)`` una sola vez mientras ``df`` siga vivo.
+
+    Sirve para estructuras derivadas del dataset compartido (cubos, índices...)
+    que se invalidan solas cuando la carga reemplaza el DataFrame.
+    """
+    clave = id(df)
+    with _lock_derivados:
+        referencia, valores = _derivados.get(clave, (None, None))
+        if referencia is None or referencia() is not df:
+            valores = {}
+            referencia = weakref.ref(df, lambda _, clave=clave: _derivados.pop(clave, None))
+            _derivados[clave] = (referencia, valores)
+        if nombre not in valores:
+            valores[nombre] = construir(df)
+        return valores[nombre]
@@ -0,0 +1,42 @@
+"""Catálogo de metadatos para los filtros de la barra lateral.
+
+Se construye una vez por conjunto de datos (con :func:`dashboard.carga.derivado`)
+y guarda lo que necesitan los widgets sin volver a recorrer las filas: los
+valores de cada dimensión en orden de aparición, cuántas filas tiene cada
+valor, el rango de ``fecha`` y la jerarquía departamento → ciudad (con
+``cod_dep`` y ``cod_ciu`` cuando están en los datos).
+"""
+import hashlib
+
+from dashboard.filtros import DIMENSIONES_FILTRO, _clave
+
+
+class Catalogo:
+    """Dominios, conteos, rango de fechas y jerarquía geográfica de las ventas."""
+
+    def __init__(self, df, dimensiones=DIMENSIONES_FILTRO):
+        self.fecha_min = df['fecha'].min()
+        self.fecha_max = df['fecha'].max()
+        self.filas = len(df)
+        self.dominios = {d: df[d].unique().tolist() for d in dimensiones}
+        self.conteos = {d: df[d].value_counts(dropna=False, sort=False) for d in dimensiones}
+        codigos = [c for c in ('cod_dep', 'cod_ciu') if c in df]
+        # Una fila por (departamento, ciudad) con sus códigos y cantidad de ventas.
+        self.jerarquia = (df.groupby(['departamento', 'ciudad', *codigos], observed=True, dropna=False)
+                          .size().rename('filas').reset_index())
+        self._ciudades_por_departamento = {}
+        for departamento, ciudad in zip(self.jerarquia['departamento'], self.jerarquia['ciudad']):
+            self._ciudades_por_departamento.setdefault(_clave(departamento), set()).add(_clave(ciudad))
+
+    def ciudades(self, departamentos):
+        """Ciudades con ventas en ``departamentos``, en el orden de ``dominios['ciudad']``."""
+        permitidas = set()
+        for departamento in departamentos:
+            permitidas |= self._ciudades_por_departamento.get(_clave(departamento), set())
+        return [ciudad for ciudad in self.dominios['ciudad'] if _clave(ciudad) in permitidas]
+
+
+def huella_seleccion(valores):
+    """Hash corto y estable de una selección, para incluirlo en la clave de un widget."""
+    texto = '|'.join(sorted(str(_clave(valor)) for valor in valores))
+    return hashlib.sha1(texto.encode()).hexdigest()[:10]
@@ -0,0 +1,24 @@
+"""Métricas RFM (recencia, frecuencia, valor monetario) por cliente.
+
+Se calculan sobre las ventas ya filtradas y se agrupan por el código
+``cliente``; ``nom_cli`` solo se conserva para mostrar.
+"""
+import pandas as pd
+
+
+def metricas_rfm(df, fecha_referencia=None, medida='pre_tot'):
+    """Una fila por cliente con ventas, número de compras, última compra y recencia.
+
+    ``ventas_totales`` suma la columna ``medida`` de ``df``. La recencia se
+    mide en días hasta ``fecha_referencia`` (por defecto la última fecha de ``df``).
+    """
+    rfm = df.groupby('cliente', observed=True).agg(
+        nom_cli=('nom_cli', 'first'),
+        ventas_totales=(medida, 'sum'),
+        frecuencia_compras=('num_doc', 'nunique'),
+        ultima_compra=('fecha', 'max'),
+    ).reset_index()
+    if fecha_referencia is None:
+        fecha_referencia = df['fecha'].max()
+    rfm['recencia_dias'] = (pd.Timestamp(fecha_referencia) - rfm['ultima_compra']).dt.days
+    return rfm
@@ -0,0 +1,42 @@
+"""Cubo diario preagregado para los gráficos de evolución y de top 10.
+
+El cubo guarda las medidas sumadas por (día, departamento, ciudad, nom_sub,
+des_item). Filtrar y reagrupar sobre él cuesta lo mismo sin importar cuántas
+líneas de factura tenga el histórico. Se filtra con
+:class:`dashboard.filtros.IndiceFiltros`, igual que la tabla de ventas. Las
+ventas en otras monedas no se guardan: se convierten desde ``pre_tot`` con la
+TRM de cada día (:mod:`dashboard.monedas`).
+"""
+import pandas as pd
+
+DIMENSIONES_CUBO = ['departamento', 'ciudad', 'nom_sub', 'des_item']
+MEDIDAS = ['pre_tot', 'cantidad']
+
+FRECUENCIAS = {
+    'Dia': 'D',
+    'Semanal': 'W',
+    'Mensual': 'ME',
+    'Trimestral': 'QE',
+    'Anual': 'YE',
+}
+
+
+def construir_cubo(df):
+    """Agrega las líneas de venta por día y dimensiones, ordenado por ``fecha``."""
+    dia = df['fecha'].dt.normalize()
+    cubo = (df.groupby([dia, *(df[c] for c in DIMENSIONES_CUBO)], observed=True, dropna=False)[MEDIDAS]
+            .sum()
+            .reset_index())
+    return cubo
+
+
+def serie_temporal(cubo, agrupacion, medida='pre_tot'):
+    """Serie de ``medida`` para una opción de ``agrupacion_tiempo`` ('Dia', ..., 'Anual')."""
+    return (cubo.groupby(pd.Grouper(key='fecha', freq=FRECUENCIAS[agrupacion]))[medida]
+            .sum()
+            .reset_index())
+
+
+def totales_por(cubo, columnas, medida='pre_tot'):
+    """Total de ``medida`` por ``columnas`` (p. ej. ``['nom_sub', 'des_item']``)."""
+    return cubo.groupby(columnas, observed=True)[medida].sum().reset_index()
@@ -0,0 +1,70 @@
+"""Etiquetas del eje de tiempo para las cinco opciones de ``agrupacion_tiempo``.
+
+El eje y se titula con la moneda de la medida graficada (:func:`etiqueta_ventas`).
+
+Todas las etiquetas se calculan con operaciones vectorizadas sobre la serie
+de fechas (``dt.weekday``, ``dt.to_period``...) y las anotaciones de año se
+añaden al gráfico en una sola actualización del layout.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard.monedas import NOMBRES_MONEDAS, moneda_de
+
+MESES = np.array(['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic'])
+TRIMESTRES = np.array(['Tri 1', 'Tri 2', 'Tri 3', 'Tri 4'])
+
+
+def etiqueta_ventas(medida='pre_tot'):
+    """Título de las ventas totales en la moneda de ``medida`` (``'Ventas Totales (Pesos)'``)."""
+    moneda = moneda_de(medida)
+    return f'Ventas Totales ({NOMBRES_MONEDAS.get(moneda, moneda)})'
+
+
+def _etiquetas_semana(fechas):
+    # Rango lunes-domingo de la semana, recortado al mes de la fecha de corte.
+    inicio = fechas - pd.to_timedelta(fechas.dt.weekday, unit='D')
+    fin = inicio + pd.Timedelta(days=6)
+    mes = fechas.dt.to_period('M')
+    inicio = inicio.where(inicio >= mes.dt.start_time, mes.dt.start_time)
+    fin_mes = mes.dt.end_time.dt.normalize()
+    fin = fin.where(fin <= fin_mes, fin_mes)
+    return (inicio.dt.month.astype(str) + '/' + inicio.dt.day.astype(str) + ' - ' +
+            fin.dt.month.astype(str) + '/' + fin.dt.day.astype(str)).tolist()
+
+
+def etiquetas_tiempo(fechas, agrupacion):
+    """Devuelve ``(tickvals, ticktext, fechas_año)`` para el eje x.
+
+    ``fechas_año`` son los puntos donde se anota el año debajo del eje.
+    ``tickvals`` es ``None`` cuando se deja el eje automático de Plotly.
+    """
+    fechas = pd.Series(pd.to_datetime(fechas)).reset_index(drop=True)
+    if agrupacion == 'Dia':
+        return None, None, fechas.iloc[:0]
+    if agrupacion == 'Semanal':
+        return fechas, _etiquetas_semana(fechas), fechas.iloc[:0]
+    if agrupacion == 'Mensual':
+        return fechas, MESES[fechas.dt.month - 1].tolist(), fechas[fechas.dt.month == 1]
+    if agrupacion == 'Trimestral':
+        return fechas, TRIMESTRES[fechas.dt.quarter - 1].tolist(), fechas[fechas.dt.quarter == 1]
+    # Anual: sin marcas, el año va como anotación bajo cada punto.
+    return [], fechas.dt.year.astype(str).tolist(), fechas
+
+
+def aplicar_eje_tiempo(fig, fechas, agrupacion, medida='pre_tot'):
+    """Configura los ejes de ``fig`` según ``agrupacion`` y ``medida`` con un único ``update_layout``."""
+    tickvals, ticktext, fechas_año = etiquetas_tiempo(fechas, agrupacion)
+    anotaciones = [
+        dict(x=fecha, y=0, yref='paper', text=str(fecha.year), showarrow=False,
+             yshift=-50, font=dict(size=13))
+        for fecha in fechas_año
+    ]
+    xaxis = dict(title='Semana' if agrupacion == 'Semanal' else 'Fecha')
+    if tickvals is not None:
+        xaxis.update(tickmode='array', tickvals=tickvals, ticktext=ticktext)
+    yaxis = dict(title=etiqueta_ventas(medida))
+    if agrupacion == 'Trimestral':
+        yaxis['tickformat'] = ',.0f'
+    fig.update_layout(xaxis=xaxis, yaxis=yaxis, annotations=anotaciones)
+    return fig
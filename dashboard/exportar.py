@@ -0,0 +1,102 @@
+"""Exportación por bloques de la selección filtrada y de las tablas resumen.
+
+Los datos se escriben bloque a bloque (CSV, Parquet o Arrow IPC) a partir de
+las posiciones del índice de filtros, así que exportar millones de filas no
+crea una segunda copia completa del DataFrame: en memoria solo hay un bloque
+a la vez más el archivo que se está escribiendo.
+"""
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+TAM_BLOQUE = 100_000
+
+# Extensión y tipo MIME de cada formato de exportación.
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow IPC': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+
+
+def bloques_de(df, posiciones=slice(None), tam_bloque=TAM_BLOQUE):
+    """Genera las filas ``posiciones`` de ``df`` en DataFrames de a ``tam_bloque``."""
+    if isinstance(posiciones, slice):
+        inicio, fin, _ = posiciones.indices(len(df))
+        cortes = [slice(desde, min(desde + tam_bloque, fin)) for desde in range(inicio, fin, tam_bloque)]
+    else:
+        cortes = [posiciones[desde:desde + tam_bloque] for desde in range(0, len(posiciones), tam_bloque)]
+    # Una selección vacía produce un bloque vacío, para que el archivo tenga esquema.
+    for corte in cortes or [slice(0, 0)]:
+        yield df.iloc[corte]
+
+
+def _tabla_arrow(bloque, esquema=None):
+    if isinstance(bloque, pd.DataFrame):
+        return pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False)
+    tabla = pa.Table.from_batches([bloque]) if isinstance(bloque, pa.RecordBatch) else bloque
+    return tabla if esquema is None else tabla.cast(esquema)
+
+
+def _esquema_csv(esquema):
+    # El escritor CSV de Arrow no acepta columnas de diccionario (categóricas).
+    return pa.schema([campo.with_type(campo.type.value_type) if pa.types.is_dictionary(campo.type) else campo
+                      for campo in esquema])
+
+
+def _abrir_escritor(formato, destino, esquema):
+    if formato == 'CSV':
+        return pacsv.CSVWriter(destino, esquema)
+    if formato == 'Parquet':
+        return pq.ParquetWriter(destino, esquema)
+    return pa.ipc.new_file(destino, esquema)
+
+
+def escribir_bloques(bloques, formato, destino):
+    """Escribe los ``bloques`` (DataFrames o lotes de Arrow) en ``destino`` (ruta o archivo binario)."""
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconocido: {formato!r}')
+    escritor = None
+    esquema = None
+    try:
+        for bloque in bloques:
+            if esquema is None:
+                tabla = _tabla_arrow(bloque)
+                esquema = _esquema_csv(tabla.schema) if formato == 'CSV' else tabla.schema
+                escritor = _abrir_escritor(formato, destino, esquema)
+            tabla = _tabla_arrow(bloque, esquema)
+            escritor.write_table(tabla)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return destino
+
+
+def archivo_exportado(bloques, formato):
+    """Archivo temporal de solo lectura (``BufferedReader``) con los ``bloques`` en ``formato``.
+
+    Sirve como ``data`` de ``st.download_button``, que acepta lectores pero no
+    archivos de lectura y escritura. En POSIX el archivo se borra del disco
+    apenas se abre y desaparece al cerrarse.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconocido: {formato!r}')
+    with tempfile.NamedTemporaryFile(suffix=f'.{FORMATOS[formato][0]}', delete=False) as temporal:
+        ruta = temporal.name
+        try:
+            escribir_bloques(bloques, formato, temporal)
+        except BaseException:
+            temporal.close()
+            os.unlink(ruta)
+            raise
+    archivo = open(ruta, 'rb')
+    try:
+        os.unlink(ruta)
+    except OSError:
+        # Windows no borra archivos abiertos; queda en el directorio temporal.
+        pass
+    return archivo
@@ -0,0 +1,253 @@
+"""Construcción de los gráficos de Plotly como funciones puras de sus datos.
+
+Cada figura depende solo de la firma del filtro, la agrupación de tiempo y
+la moneda, así que se guarda en una :class:`dashboard.cache.CacheLRU` con esa
+clave. Se cachea el objeto ``Figure`` ya validado: reconstruirlo desde JSON
+cuesta más que volver a armarlo, y Streamlit lo serializa al mostrarlo.
+Las figuras cacheadas se comparten entre sesiones y no deben modificarse.
+
+Por encima de ``UMBRAL_WEBGL`` puntos las series se dibujan con trazas WebGL
+(``Scattergl``) y se reducen con LTTB a ``PUNTOS_VISIBLES``, más o menos el
+ancho en píxeles del gráfico.
+
+Plotly se importa dentro de cada función: importarlo cuesta una décima de
+segundo que no tiene por qué pagar el arranque antes del primer gráfico.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard.ejes import aplicar_eje_tiempo, etiqueta_ventas
+from dashboard.muestreo import lttb
+
+UMBRAL_WEBGL = 5000
+PUNTOS_VISIBLES = 2000
+
+TITULOS_EVOLUCION = {
+    'Dia': 'Evolución de Ventas Diarias',
+    'Semanal': 'Evolución de Ventas Semanales',
+    'Mensual': 'Evolución de Ventas Mensuales',
+    'Trimestral': 'Evolución de Ventas Trimestrales',
+    'Anual': 'Evolución de Ventas Anuales',
+}
+
+
+def clave_figura(nombre, firma, agrupacion=None, moneda='pre_tot'):
+    """Clave de caché de una figura: (gráfico, filtro, agrupación, moneda)."""
+    return nombre, firma, agrupacion, moneda
+
+
+def figura_evolucion(df_agrupado, agrupacion, medida='pre_tot', pronostico=None):
+    """Línea de ventas en el tiempo para una opción de ``agrupacion_tiempo``.
+
+    ``pronostico`` (de :meth:`dashboard.pronostico.Pronosticos.para`) agrega
+    la línea pronosticada y su banda del 80 %.
+    """
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.update_layout(title=TITULOS_EVOLUCION[agrupacion])
+    fechas = df_agrupado['fecha']
+    if pronostico is not None:
+        fechas = pd.concat([fechas, pronostico['fecha']]).drop_duplicates().sort_values()
+    aplicar_eje_tiempo(fig, fechas, agrupacion, medida)
+    if len(df_agrupado) > UMBRAL_WEBGL:
+        # Solo ocurre en 'Dia' con historias muy largas: WebGL y serie reducida.
+        visibles = df_agrupado.iloc[lttb(df_agrupado['fecha'], df_agrupado[medida], PUNTOS_VISIBLES)]
+        fig.add_trace(go.Scattergl(x=visibles['fecha'], y=visibles[medida], mode='lines', name='Ventas'))
+    else:
+        fig.add_trace(go.Scatter(
+            x=df_agrupado['fecha'],
+            y=df_agrupado[medida],
+            mode='lines',
+            name='Ventas')
+        )
+    if pronostico is not None:
+        _agregar_pronostico(fig, pronostico)
+    return fig
+
+
+def _agregar_pronostico(fig, pronostico):
+    import plotly.graph_objects as go
+    # La banda es el área entre el límite superior y el inferior.
+    fig.add_trace(go.Scatter(
+        x=pronostico['fecha'],
+        y=pronostico['superior'],
+        mode='lines',
+        line=dict(width=0),
+        showlegend=False,
+        hoverinfo='skip',
+    ))
+    fig.add_trace(go.Scatter(
+        x=pronostico['fecha'],
+        y=pronostico['inferior'],
+        mode='lines',
+        line=dict(width=0),
+        fill='tonexty',
+        fillcolor='rgba(255, 127, 14, 0.2)',
+        name='Intervalo 80%',
+    ))
+    fig.add_trace(go.Scatter(
+        x=pronostico['fecha'],
+        y=pronostico['pronostico'],
+        mode='lines+markers',
+        line=dict(color='rgb(255, 127, 14)', dash='dash'),
+        name='Pronóstico',
+    ))
+
+
+def figura_top_subgrupos(df_subgrupo, medida='pre_tot'):
+    """Barras horizontales de los 10 subgrupos con más ventas (``df_subgrupo`` en orden ascendente)."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    df_top_subgrupo = df_subgrupo.tail(10)
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(
+        go.Bar(
+            y=df_top_subgrupo['nom_sub'],
+            x=df_top_subgrupo[medida],
+            name=etiqueta_ventas(medida),
+            marker_color='indianred',
+            orientation='h',
+        ),
+        secondary_y=False,
+    )
+    fig.update_layout(
+        title_text='Top 10 Subgrupos por Ventas Totales',
+        height=600,
+    )
+    fig.update_xaxes(title_text=etiqueta_ventas(medida), tickangle=0)
+    fig.update_yaxes(
+        title_text='Subgrupo',
+        secondary_y=False,
+        tickformat=',.0f'
+    )
+    fig.update_yaxes(
+        title_text='Porcentaje Acumulado (%)',
+        secondary_y=True,
+        range=[0, 110]
+    )
+    return fig
+
+
+def figura_top_productos(df_productos, medida='pre_tot'):
+    """Barras horizontales de los 10 productos con más ventas (``df_productos`` en orden ascendente)."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    df_top_productos = df_productos.tail(10)
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(
+        go.Bar(
+            y=df_top_productos['des_item'],
+            x=df_top_productos[medida],
+            name=etiqueta_ventas(medida),
+            marker_color='lightsalmon',
+            orientation='h',
+        ),
+        secondary_y=False,
+    )
+    fig.update_layout(
+        title_text='Top 10 Productos por Ventas Totales',
+        height=600,
+    )
+    fig.update_yaxes(title_text='Producto', secondary_y=False)
+    fig.update_xaxes(title_text=etiqueta_ventas(medida))
+    return fig
+
+
+def figura_pareto_clientes(df_clientes, n_top):
+    """Pareto de clientes: ventas por cliente y porcentaje acumulado.
+
+    ``df_clientes`` viene ordenado de mayor a menor (``AnalisisPareto.tabla``);
+    los primeros ``n_top`` se resaltan en rojo.
+    """
+    import plotly.graph_objects as go
+    if len(df_clientes) > UMBRAL_WEBGL:
+        return _figura_pareto_clientes_grande(df_clientes, n_top)
+
+    df_pareto = df_clientes.copy()
+    df_pareto['cliente_rank'] = range(1, len(df_pareto) + 1)
+    df_pareto['es_top_5'] = df_pareto['cliente_rank'] <= n_top
+
+    fig = go.Figure()
+
+    # Barras para ventas por cliente
+    fig.add_trace(go.Bar(
+        x=df_pareto['cliente_rank'],
+        y=df_pareto['ventas_totales'],
+        name='Ventas por Cliente',
+        marker_color=df_pareto['es_top_5'].map({True: 'red', False: 'lightblue'})
+    ))
+
+    # Línea de porcentaje acumulado
+    fig.add_trace(go.Scatter(
+        x=df_pareto['cliente_rank'],
+        y=df_pareto['porcentaje_acumulado'],
+        name='% Acumulado',
+        line=dict(color='orange', width=3),
+        yaxis='y2'
+    ))
+
+    _completar_pareto_clientes(fig, len(df_pareto))
+    return fig
+
+
+def _figura_pareto_clientes_grande(df_clientes, n_top):
+    import plotly.graph_objects as go
+    # Los clientes top se dibujan completos; la cola larga y la curva acumulada
+    # se reducen con LTTB. Todo con trazas WebGL.
+    ranking = np.arange(1, len(df_clientes) + 1)
+    ventas = df_clientes['ventas_totales'].to_numpy()
+    acumulado = df_clientes['porcentaje_acumulado'].to_numpy()
+    cola = n_top + lttb(ranking[n_top:], ventas[n_top:], PUNTOS_VISIBLES)
+    curva = lttb(ranking, acumulado, PUNTOS_VISIBLES)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=ranking[:n_top],
+        y=ventas[:n_top],
+        name='Ventas por Cliente (top)',
+        mode='lines',
+        fill='tozeroy',
+        line=dict(color='red'),
+    ))
+    fig.add_trace(go.Scattergl(
+        x=ranking[cola],
+        y=ventas[cola],
+        name='Ventas por Cliente',
+        mode='lines',
+        fill='tozeroy',
+        line=dict(color='lightblue'),
+    ))
+    fig.add_trace(go.Scattergl(
+        x=ranking[curva],
+        y=acumulado[curva],
+        name='% Acumulado',
+        line=dict(color='orange', width=3),
+        yaxis='y2'
+    ))
+    _completar_pareto_clientes(fig, len(df_clientes))
+    return fig
+
+
+def _completar_pareto_clientes(fig, n_clientes):
+    import plotly.graph_objects as go
+    # Línea del 5%
+    fig.add_trace(go.Scatter(
+        x=[0, n_clientes],
+        y=[5, 5],
+        name='Umbral 5%',
+        line=dict(color='red', width=2, dash='dash'),
+        yaxis='y2'
+    ))
+
+    fig.update_layout(
+        title='Distribución de Valor de Clientes - Principio de Pareto',
+        xaxis_title='Ranking de Clientes',
+        yaxis_title='Ventas Totales',
+        yaxis2=dict(
+            title='Porcentaje Acumulado (%)',
+            overlaying='y',
+            side='right',
+            range=[0, 100]
+        ),
+        showlegend=True
+    )
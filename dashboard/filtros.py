@@ -0,0 +1,112 @@
+"""Motor de filtros con índices invertidos por dimensión.
+
+La tabla se mantiene ordenada por ``fecha``: el rango de fechas se resuelve
+con ``searchsorted`` y cada valor de ``departamento``, ``ciudad`` y
+``nom_sub`` guarda la lista ordenada de filas donde aparece. Una dimensión
+con todos sus valores seleccionados no se evalúa, así que el caso por
+defecto no construye ninguna máscara.
+"""
+import numpy as np
+import pandas as pd
+
+DIMENSIONES_FILTRO = ('departamento', 'ciudad', 'nom_sub')
+
+
+def _clave(valor):
+    # Los nulos (NaN/None) de los selectores se agrupan bajo una sola clave.
+    return None if pd.isna(valor) else valor
+
+
+def listas_de(columna):
+    """``{valor: filas}`` con las posiciones ordenadas de cada valor de ``columna``."""
+    codigos, valores = pd.factorize(columna, use_na_sentinel=True)
+    # Los nulos (-1) quedan al final al desplazar los códigos.
+    codigos = np.where(codigos < 0, len(valores), codigos)
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.cumsum(np.bincount(codigos, minlength=len(valores) + 1))
+    partes = np.split(orden, limites[:-1])
+    listas = {_clave(valor): parte for valor, parte in zip(valores, partes)}
+    if len(partes[-1]):
+        listas[None] = partes[-1]
+    return listas
+
+
+def listas_por_dimension(df, dimensiones=DIMENSIONES_FILTRO):
+    """Listas de filas de cada dimensión de ``df`` (ya ordenado por fecha), como las de :class:`IndiceFiltros`."""
+    return {dimension: listas_de(df[dimension]) for dimension in dimensiones}
+
+
+class IndiceFiltros:
+    """Índice de filas de ``df`` por fecha y por valor de cada dimensión.
+
+    ``listas`` permite reutilizar listas ya calculadas (p. ej. leídas de una
+    instantánea); deben corresponder a ``df`` ordenado por fecha.
+    """
+
+    def __init__(self, df, dimensiones=DIMENSIONES_FILTRO, columna_fecha='fecha', listas=None):
+        if not df[columna_fecha].is_monotonic_increasing:
+            if listas is not None:
+                raise ValueError('Las listas precalculadas requieren la tabla ordenada por fecha')
+            df = df.sort_values(columna_fecha, kind='stable', ignore_index=True)
+        self.df = df
+        self._fechas = df[columna_fecha].to_numpy()
+        self._listas = listas if listas is not None else listas_por_dimension(df, dimensiones)
+
+    def _rango(self, fecha_inicio, fecha_final):
+        inicio = 0 if fecha_inicio is None else np.searchsorted(
+            self._fechas, np.datetime64(pd.Timestamp(fecha_inicio)), side='left')
+        fin = len(self._fechas) if fecha_final is None else np.searchsorted(
+            self._fechas, np.datetime64(pd.Timestamp(fecha_final)), side='right')
+        return int(inicio), int(fin)
+
+    def es_todo(self, dimension, valores):
+        """``True`` si ``valores`` cubre todos los valores de ``dimension``."""
+        listas = self._listas[dimension]
+        return {_clave(valor) for valor in valores} >= listas.keys()
+
+    def firma(self, seleccion, fecha_inicio=None, fecha_final=None):
+        """Clave canónica y hashable de un filtro, para usar en cachés.
+
+        Dos filtros con la misma firma seleccionan exactamente las mismas filas
+        de esta tabla: las fechas se reducen al rango de filas que abarcan y
+        una dimensión completa se representa como ``'*'``.
+        """
+        dimensiones = tuple(
+            (dimension, '*' if self.es_todo(dimension, valores) else
+             tuple(sorted({_clave(valor) for valor in valores}, key=lambda v: (v is None, str(v)))))
+            for dimension, valores in sorted(seleccion.items())
+        )
+        return self._rango(fecha_inicio, fecha_final), dimensiones
+
+    def posiciones(self, seleccion, fecha_inicio=None, fecha_final=None):
+        """Filas que cumplen los filtros, como ``slice`` o arreglo ordenado de posiciones.
+
+        ``seleccion`` asocia cada dimensión con los valores elegidos; las
+        dimensiones ausentes no filtran.
+        """
+        inicio, fin = self._rango(fecha_inicio, fecha_final)
+        candidatos = []
+        for dimension, valores in seleccion.items():
+            if self.es_todo(dimension, valores):
+                continue
+            listas = self._listas[dimension]
+            partes = []
+            for valor in {_clave(valor) for valor in valores}:
+                lista = listas.get(valor)
+                if lista is not None:
+                    desde, hasta = np.searchsorted(lista, (inicio, fin))
+                    partes.append(lista[desde:hasta])
+            filas = np.concatenate(partes) if partes else np.empty(0, dtype=np.intp)
+            candidatos.append(filas)
+        if not candidatos:
+            return slice(inicio, fin)
+        # Se intersecta empezando por la selección más pequeña.
+        candidatos.sort(key=len)
+        resultado = np.sort(candidatos[0])
+        for filas in candidatos[1:]:
+            resultado = np.intersect1d(resultado, filas, assume_unique=True)
+        return resultado
+
+    def filtrar(self, seleccion, fecha_inicio=None, fecha_final=None):
+        """Subconjunto de la tabla indexada que cumple los filtros."""
+        return self.df.iloc[self.posiciones(seleccion, fecha_inicio, fecha_final)]
@@ -0,0 +1,177 @@
+"""Almacén de ventas con carga incremental de periodos nuevos.
+
+El dataset vive en un directorio con particiones Parquet (``datos/``), los
+:class:`dashboard.ingesta.Agregados` del histórico (``agregados/``, una base
+más un delta por carga en ``agregados/deltas/``) y un ``estado.json`` con la
+marca de agua (última ``fecha`` procesada) y los archivos ya ingeridos. Cada
+carga:
+
+1. descarta las filas anteriores a la marca de agua que tenía el almacén
+   antes del archivo;
+2. descarta las líneas reenviadas: las que repiten la clave (``CLAVE_LINEA``)
+   de una ya guardada, leyendo solo las particiones con ``fecha`` >= marca de
+   agua. Dos líneas idénticas de una misma entrega se conservan, como en el CSV;
+3. escribe el resto de todo el archivo como una partición nueva y sus
+   agregados como un delta; cada ``MAX_DELTAS`` deltas se compactan con la
+   base (:meth:`AlmacenVentas.compactar`).
+
+La marca de agua sube una vez por archivo, al terminarlo: los bloques de un
+mismo archivo no tienen por qué venir ordenados por ``fecha``.
+
+El costo depende del tamaño de los datos nuevos, no del histórico (salvo en
+la compactación ocasional). El
+dashboard tampoco relee el histórico: si ya tiene en memoria la versión
+anterior del almacén le añade solo las particiones nuevas
+(``leer(desde=...)``), y su cubo diario es el de ``agregados/`` (:meth:`AlmacenVentas.cubo`).
+
+Uso::
+
+    python -m dashboard.incremental ALMACEN nuevas_ventas.csv [...]
+"""
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+from dashboard.almacenamiento import COLUMNAS_DASHBOARD, escribir_parquet, tipar_ventas
+from dashboard.ingesta import Agregados, _combinar_cubos, _concatenar, leer_por_bloques
+
+# Una factura puede repetir un producto en varias líneas con otra cantidad;
+# solo una línea idéntica en estas columnas se considera reenviada.
+CLAVE_LINEA = ['num_doc', 'item', 'cantidad', 'pre_tot']
+# Deltas de agregados que se acumulan antes de combinarlos con la base.
+MAX_DELTAS = 8
+
+
+class AlmacenVentas:
+    """Directorio de ventas particionado que admite anexar datos nuevos."""
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self._datos = self.directorio / 'datos'
+        self._agregados = self.directorio / 'agregados'
+        self._deltas = self._agregados / 'deltas'
+        self._estado = self.directorio / 'estado.json'
+
+    def estado(self):
+        if not self._estado.exists():
+            return {'marca_agua': None, 'archivos': [], 'particiones': 0}
+        return json.loads(self._estado.read_text())
+
+    def version(self):
+        """Huella del contenido actual; cambia con cada carga que añade filas."""
+        return hashlib.sha256(json.dumps(self.estado(), sort_keys=True).encode()).hexdigest()
+
+    def _partes_agregados(self):
+        # La base compactada (si existe) y los deltas pendientes, en orden de carga.
+        base = [self._agregados] if (self._agregados / 'cubo.parquet').exists() else []
+        return base + sorted(self._deltas.glob('parte-*'))
+
+    @property
+    def agregados(self):
+        partes = [Agregados.cargar(ruta) for ruta in self._partes_agregados()]
+        if not partes:
+            return None
+        return partes[0].combinar(*partes[1:]) if len(partes) > 1 else partes[0]
+
+    def cubo(self):
+        """Cubo diario de todo el histórico, sin leer el resto de los agregados."""
+        cubos = [pd.read_parquet(ruta / 'cubo.parquet') for ruta in self._partes_agregados()]
+        if not cubos:
+            return None
+        return _combinar_cubos(cubos) if len(cubos) > 1 else cubos[0]
+
+    def compactar(self):
+        """Combina los deltas de agregados con la base y los borra."""
+        deltas = sorted(self._deltas.glob('parte-*'))
+        if not deltas:
+            return
+        self.agregados.guardar(self._agregados)
+        for ruta in deltas:
+            shutil.rmtree(ruta)
+
+    def _claves_desde(self, marca_agua):
+        if marca_agua is None or not self._datos.exists():
+            return pd.DataFrame(columns=CLAVE_LINEA, dtype=str)
+        dataset = ds.dataset(self._datos, format='parquet')
+        tabla = dataset.to_table(columns=CLAVE_LINEA,
+                                 filter=ds.field('fecha') >= pd.Timestamp(marca_agua))
+        return tabla.to_pandas().astype(str)
+
+    @staticmethod
+    def _filtrar(nuevas, marca_agua, guardadas):
+        # Filas de ``nuevas`` desde ``marca_agua`` cuya clave no esté en ``guardadas``.
+        nuevas = tipar_ventas(nuevas)
+        if marca_agua is not None:
+            nuevas = nuevas[nuevas['fecha'] >= pd.Timestamp(marca_agua)]
+        if len(guardadas) and len(nuevas):
+            claves = pd.MultiIndex.from_frame(nuevas[CLAVE_LINEA].astype(str))
+            nuevas = nuevas[~claves.isin(pd.MultiIndex.from_frame(guardadas))]
+        return nuevas
+
+    def _guardar(self, nuevas, archivo=None):
+        """Escribe ``nuevas`` como una partición y un delta de agregados y actualiza el estado."""
+        estado = self.estado()
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        if len(nuevas):
+            parte = f'parte-{estado["particiones"]:05d}'
+            nuevas = nuevas.sort_values('fecha', kind='stable', ignore_index=True)
+            self._datos.mkdir(parents=True, exist_ok=True)
+            escribir_parquet(nuevas, self._datos / f'{parte}.parquet')
+            Agregados.desde_bloque(nuevas).guardar(self._deltas / parte)
+            estado['particiones'] += 1
+            fecha_max = nuevas['fecha'].iloc[-1]
+            marca_agua = estado['marca_agua']
+            estado['marca_agua'] = max(pd.Timestamp(marca_agua or fecha_max), fecha_max).isoformat()
+        if archivo is not None:
+            estado['archivos'].append(archivo)
+        self._estado.write_text(json.dumps(estado, indent=1))
+        if len(list(self._deltas.glob('parte-*'))) >= MAX_DELTAS:
+            self.compactar()
+
+    def anexar(self, nuevas, _archivo=None):
+        """Incorpora las ventas de ``nuevas`` que no estén ya guardadas.
+
+        ``nuevas`` es un DataFrame o un iterable de bloques del mismo archivo;
+        todos se comparan con la marca de agua y las claves guardadas antes. Devuelve
+        el número de filas añadidas.
+        """
+        bloques = [nuevas] if isinstance(nuevas, pd.DataFrame) else nuevas
+        marca_agua = self.estado()['marca_agua']
+        previas = self._claves_desde(marca_agua)
+        filtradas = [filas for filas in (self._filtrar(bloque, marca_agua, previas) for bloque in bloques)
+                     if len(filas)]
+        nuevas = _concatenar(filtradas) if filtradas else pd.DataFrame()
+        if len(nuevas) or _archivo is not None:
+            self._guardar(nuevas, _archivo)
+        return len(nuevas)
+
+    def anexar_archivos(self, rutas, tam_bloque=None):
+        """Anexa los archivos (CSV/Parquet) que no se hayan ingerido antes."""
+        añadidas = 0
+        for ruta in rutas:
+            if Path(ruta).name in self.estado()['archivos']:
+                continue
+            kwargs = {} if tam_bloque is None else {'tam_bloque': tam_bloque}
+            añadidas += self.anexar(leer_por_bloques(ruta, **kwargs), _archivo=Path(ruta).name)
+        return añadidas
+
+    def leer(self, columnas=COLUMNAS_DASHBOARD, desde=0):
+        """Ventas guardadas en las particiones ``desde`` en adelante, ordenadas por ``fecha``."""
+        partes = sorted(self._datos.glob('parte-*.parquet'))
+        dataset = ds.dataset([str(parte) for parte in partes if int(parte.stem[6:]) >= desde],
+                             format='parquet', schema=ds.dataset(partes[0]).schema if partes else None)
+        # Los almacenes creados antes de añadir columnas al dashboard no las tienen.
+        columnas = [columna for columna in columnas if columna in dataset.schema.names]
+        df = dataset.to_table(columns=columnas).to_pandas()
+        return df.sort_values('fecha', kind='stable', ignore_index=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('uso: python -m dashboard.incremental ALMACEN ORIGEN [ORIGEN ...]')
+    print(AlmacenVentas(sys.argv[1]).anexar_archivos(sys.argv[2:]))
@@ -0,0 +1,39 @@
+"""Indicadores clave de la parte superior del dashboard."""
+from dashboard.hll import UMBRAL_EXACTO
+from dashboard.monedas import medida_en
+
+
+def indicadores_clave(totales, df_filtrado, bocetos=None, filtro=None, umbral_exacto=UMBRAL_EXACTO,
+                      filas=None):
+    """Ventas en pesos y dólares y clientes/productos distintos.
+
+    ``totales`` tiene la suma de cada medida en la selección, incluida la de
+    ``pre_tot`` en dólares (de :meth:`dashboard.prefijos.IndicePrefijos.totales`
+    o, p. ej., ``cubo_filtrado[MEDIDAS].sum()`` más la medida convertida).
+
+    Con ``bocetos`` (:class:`dashboard.hll.BocetosDistintos`) y una selección
+    de más de ``umbral_exacto`` filas, los distintos se estiman uniendo los
+    bocetos de las celdas de ``filtro`` = ``(seleccion, fecha_inicio,
+    fecha_final)``; si no, se cuentan exactamente sobre ``df_filtrado``.
+
+    ``df_filtrado`` también puede ser una función que devuelva la selección;
+    con su número de ``filas`` solo se llama para el conteo exacto.
+    """
+    if filas is None:
+        filas = len(df_filtrado)
+    aproximado = bocetos is not None and filas > umbral_exacto
+    if aproximado:
+        clientes = bocetos.contar('cliente', *filtro)
+        productos = bocetos.contar('item', *filtro)
+    else:
+        if callable(df_filtrado):
+            df_filtrado = df_filtrado()
+        clientes = df_filtrado['cliente'].nunique()
+        productos = df_filtrado['item'].nunique()
+    return {
+        'ventas_pesos': totales['pre_tot'],
+        'ventas_dolares': totales[medida_en('USD')],
+        'clientes_unicos': clientes,
+        'productos_vendidos': productos,
+        'distintos_aproximados': aproximado,
+    }
@@ -0,0 +1,179 @@
+"""Ingesta por bloques de exportaciones de ventas que no caben en memoria.
+
+Los archivos se leen de a ``tam_bloque`` filas; cada bloque se tipa y se
+resume en :class:`Agregados` (cubo diario, estadísticas por cliente y pares
+cliente/factura), que se combinan entre sí. La memoria máxima depende del
+tamaño del bloque y de los agregados, no del archivo.
+
+La carga del dashboard lee los CSV con :func:`leer_para_dashboard`: la
+tabla se tipa bloque a bloque (sin el costo de parsear todo el archivo como
+texto), y el cubo diario del motor y la TRM que traiga el export se pliegan de
+los bloques en vez de recalcularse.
+
+Uso::
+
+    python -m dashboard.ingesta DESTINO export_2014.csv export_2015.csv ...
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from dashboard.almacenamiento import COLUMNAS_DASHBOARD, leer_csv, tipar_ventas
+from dashboard.cubo import DIMENSIONES_CUBO, MEDIDAS, construir_cubo, serie_temporal, totales_por
+from dashboard.monedas import TablaTRM
+
+TAM_BLOQUE = 250_000
+
+
+def _concatenar(frames):
+    # Los bloques traen categorías distintas; pd.concat las volvería object.
+    df = pd.concat(frames, ignore_index=True)
+    for columna in df.columns:
+        if isinstance(df[columna].dtype, pd.CategoricalDtype):
+            continue
+        if all(isinstance(frame[columna].dtype, pd.CategoricalDtype) for frame in frames):
+            # Se unen las categorías de los bloques sin volver a factorizar el texto.
+            df[columna] = union_categoricals([frame[columna] for frame in frames], sort_categories=True)
+        elif any(isinstance(frame[columna].dtype, pd.CategoricalDtype) for frame in frames):
+            df[columna] = df[columna].astype('category')
+    return df
+
+
+def _combinar_clientes(agregados):
+    # Clientes y pares cliente/factura combinados de varios Agregados.
+    clientes = (_concatenar([a.clientes for a in agregados])
+                .groupby('cliente', observed=True)
+                .agg(nom_cli=('nom_cli', 'first'),
+                     ventas_totales=('ventas_totales', 'sum'),
+                     ultima_compra=('ultima_compra', 'max'))
+                .reset_index())
+    documentos = _concatenar([a.documentos for a in agregados]).drop_duplicates(ignore_index=True)
+    return clientes, documentos
+
+
+def _combinar_cubos(cubos):
+    if all(a['fecha'].max() < b['fecha'].min() for a, b in zip(cubos, cubos[1:])):
+        # Bloques de días distintos (un export ordenado por fecha): solo se concatenan.
+        return _concatenar(cubos)
+    return (_concatenar(cubos)
+            .groupby(['fecha', *DIMENSIONES_CUBO], observed=True, dropna=False)[MEDIDAS]
+            .sum()
+            .reset_index())
+
+
+class Agregados:
+    """Resúmenes combinables de un conjunto de ventas.
+
+    ``cubo`` tiene el formato de :func:`dashboard.cubo.construir_cubo`;
+    ``clientes`` una fila por ``cliente`` con ``nom_cli``, ``ventas_totales``
+    y ``ultima_compra``; ``documentos`` los pares únicos (``cliente``,
+    ``num_doc``) para contar compras sin duplicar facturas partidas entre
+    bloques.
+    """
+
+    ARCHIVOS = ('cubo', 'clientes', 'documentos')
+
+    def __init__(self, cubo, clientes, documentos):
+        self.cubo = cubo
+        self.clientes = clientes
+        self.documentos = documentos
+
+    @classmethod
+    def desde_bloque(cls, df):
+        clientes = df.groupby('cliente', observed=True).agg(
+            nom_cli=('nom_cli', 'first'),
+            ventas_totales=('pre_tot', 'sum'),
+            ultima_compra=('fecha', 'max'),
+        ).reset_index()
+        documentos = df[['cliente', 'num_doc']].drop_duplicates(ignore_index=True)
+        return cls(construir_cubo(df), clientes, documentos)
+
+    def combinar(self, *otros):
+        """Nuevos agregados equivalentes a haber procesado todos los bloques juntos."""
+        todos = (self, *otros)
+        return Agregados(_combinar_cubos([a.cubo for a in todos]), *_combinar_clientes(todos))
+
+    @property
+    def mensual(self):
+        return serie_temporal(self.cubo, 'Mensual')
+
+    @property
+    def por_subgrupo(self):
+        return totales_por(self.cubo, ['nom_sub'])
+
+    @property
+    def por_producto(self):
+        return totales_por(self.cubo, ['nom_sub', 'des_item'])
+
+    @property
+    def por_cliente(self):
+        """Ventas, número de compras y última compra por cliente."""
+        frecuencia = self.documentos.groupby('cliente', observed=True).size().rename('frecuencia_compras')
+        return self.clientes.join(frecuencia, on='cliente')
+
+    def guardar(self, directorio):
+        directorio = Path(directorio)
+        directorio.mkdir(parents=True, exist_ok=True)
+        for nombre in self.ARCHIVOS:
+            getattr(self, nombre).to_parquet(directorio / f'{nombre}.parquet', index=False)
+
+    @classmethod
+    def cargar(cls, directorio):
+        directorio = Path(directorio)
+        return cls(*(pd.read_parquet(directorio / f'{nombre}.parquet') for nombre in cls.ARCHIVOS))
+
+
+def leer_por_bloques(fuentes, tam_bloque=TAM_BLOQUE, columnas=COLUMNAS_DASHBOARD):
+    """Genera DataFrames tipados de a lo sumo ``tam_bloque`` filas.
+
+    ``fuentes`` es una ruta o un iterable de rutas CSV/Parquet.
+    """
+    if isinstance(fuentes, (str, Path)):
+        fuentes = [fuentes]
+    for fuente in fuentes:
+        if str(fuente).endswith('.parquet'):
+            for lote in pq.ParquetFile(fuente).iter_batches(batch_size=tam_bloque, columns=columnas):
+                yield tipar_ventas(lote.to_pandas())
+        else:
+            yield from leer_csv(fuente, columnas=columnas, chunksize=tam_bloque)
+
+
+def leer_para_dashboard(fuente, tam_bloque=TAM_BLOQUE, columna_trm='TRM'):
+    """``(ventas, cubo, trm)`` de ``fuente`` (ruta o archivo CSV), leídos por bloques.
+
+    ``ventas`` es la tabla tipada, ``cubo`` su cubo diario y ``trm`` la
+    :class:`dashboard.monedas.TablaTRM` de la ``columna_trm`` del export, o
+    ``None`` si no la trae. El texto se parsea de a ``tam_bloque`` filas: la
+    memoria máxima depende del tamaño de la tabla tipada, no del archivo.
+    """
+    inicio = fuente.tell() if hasattr(fuente, 'tell') else None
+    con_trm = columna_trm in pd.read_csv(fuente, nrows=0).columns
+    if inicio is not None:
+        fuente.seek(inicio)
+    columnas = [*COLUMNAS_DASHBOARD, columna_trm] if con_trm else COLUMNAS_DASHBOARD
+    bloques, cubos, tasas = [], [], []
+    for bloque in leer_por_bloques([fuente], tam_bloque, columnas):
+        if con_trm:
+            tasas.append(TablaTRM.desde_ventas(bloque, columna_trm))
+            bloque = bloque.drop(columns=columna_trm)
+        bloques.append(bloque)
+        cubos.append(construir_cubo(bloque))
+    return _concatenar(bloques), _combinar_cubos(cubos), TablaTRM.unir(tasas) if tasas else None
+
+
+def agregar_por_bloques(fuentes, tam_bloque=TAM_BLOQUE):
+    """Procesa ``fuentes`` bloque a bloque y devuelve sus :class:`Agregados`."""
+    agregados = None
+    for bloque in leer_por_bloques(fuentes, tam_bloque):
+        parcial = Agregados.desde_bloque(bloque)
+        agregados = parcial if agregados is None else agregados.combinar(parcial)
+    return agregados
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('uso: python -m dashboard.ingesta DESTINO ORIGEN [ORIGEN ...]')
+    agregar_por_bloques(sys.argv[2:]).guardar(sys.argv[1])
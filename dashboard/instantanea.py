@@ -0,0 +1,197 @@
+"""Instantáneas en disco del estado preparado del dashboard, para arranques en caliente.
+
+Cada versión de los datos (la huella SHA-256 del origen o la versión del
+almacén incremental) tiene un directorio en ``DASHBOARD_INSTANTANEAS``
+(``.instantaneas`` por defecto; vacío desactiva las instantáneas) con:
+
+- tablas (ventas tipadas, cubo diario, bocetos de distintos, TRM del origen)
+  como archivos Arrow IPC sin comprimir, que se abren con ``memory_map``;
+- listas de :class:`dashboard.filtros.IndiceFiltros` como ``.npy`` abiertos
+  con ``mmap_mode='r'``;
+- metadatos en JSON.
+
+Al reiniciar, la tabla de ventas se lee de la instantánea en vez de volver a
+parsear el CSV, y el motor y el catálogo se arman en un hilo aparte
+(:func:`preparar_en_segundo_plano`) reutilizando lo guardado y guardando lo
+que falte. ``FORMATO`` cambia cuando cambia lo que se guarda, y deja
+obsoletas las instantáneas anteriores.
+"""
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+_ruta = os.environ.get('DASHBOARD_INSTANTANEAS', '.instantaneas')
+DIRECTORIO_INSTANTANEAS = Path(_ruta) if _ruta else None
+FORMATO = 3
+# Versiones de los datos que se conservan en disco.
+CONSERVAR = 2
+
+
+def _escribir_atomico(ruta, escribir):
+    # Se escribe a un temporal y se renombra: un lector nunca ve un archivo a medias.
+    temporal = ruta.with_name(f'{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        escribir(temporal)
+        os.replace(temporal, ruta)
+    finally:
+        temporal.unlink(missing_ok=True)
+
+
+class Instantanea:
+    """Archivos guardados para la versión ``huella`` de los datos.
+
+    Con ``huella`` o ``directorio`` en ``None`` no se guarda nada y cada
+    método se limita a construir el valor.
+    """
+
+    def __init__(self, huella, directorio=DIRECTORIO_INSTANTANEAS):
+        self.huella = huella
+        self.ruta = None if huella is None or directorio is None else Path(directorio) / f'{huella}-v{FORMATO}'
+
+    def existe(self, nombre):
+        return self.ruta is not None and (self.ruta / f'{nombre}.arrow').exists()
+
+    def _guardar(self, nombre, escribir):
+        try:
+            nueva = not self.ruta.exists()
+            self.ruta.mkdir(parents=True, exist_ok=True)
+            _escribir_atomico(self.ruta / nombre, escribir)
+            if nueva:
+                _podar(self.ruta.parent, conservar=self.ruta)
+        except OSError:
+            # Sin disco escribible el dashboard funciona igual, solo sin arranque en caliente.
+            pass
+
+    def leer_tabla(self, nombre):
+        """DataFrame guardado como ``nombre``, leído con ``memory_map``."""
+        with pa.memory_map(str(self.ruta / f'{nombre}.arrow')) as archivo:
+            tabla = pa.ipc.open_file(archivo).read_all()
+        # Las columnas numéricas y de fecha quedan como vistas del archivo mapeado.
+        return tabla.to_pandas(split_blocks=True)
+
+    def guardar_tabla(self, nombre, df):
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+
+        def escribir(ruta):
+            with pa.OSFile(str(ruta), 'wb') as archivo, pa.ipc.new_file(archivo, tabla.schema) as escritor:
+                escritor.write_table(tabla)
+
+        self._guardar(f'{nombre}.arrow', escribir)
+
+    def tabla(self, nombre, construir):
+        """DataFrame ``nombre`` de la instantánea, o ``construir()`` guardándolo para la próxima vez."""
+        if self.existe(nombre):
+            return self.leer_tabla(nombre)
+        df = construir()
+        if self.ruta is not None:
+            self.guardar_tabla(nombre, df)
+        return df
+
+    def listas(self, nombre, construir):
+        """Listas ``{dimensión: {valor: filas}}`` de un índice, guardadas como ``.npy``."""
+        if self.ruta is not None and (self.ruta / f'{nombre}.json').exists():
+            valores = json.loads((self.ruta / f'{nombre}.json').read_text())
+            listas = {}
+            for dimension, pares in valores.items():
+                filas = np.load(self.ruta / f'{nombre}.{dimension}.npy', mmap_mode='r')
+                limites = np.cumsum([largo for _, largo in pares])[:-1]
+                listas[dimension] = {valor: parte for (valor, _), parte in zip(pares, np.split(filas, limites))}
+            return listas
+        listas = construir()
+        serializables = all(valor is None or isinstance(valor, str)
+                            for por_valor in listas.values() for valor in por_valor)
+        if self.ruta is not None and serializables:
+            for dimension, por_valor in listas.items():
+                filas = np.concatenate(list(por_valor.values())) if por_valor else np.empty(0, dtype=np.intp)
+                self._guardar(f'{nombre}.{dimension}.npy', lambda ruta, filas=filas: _guardar_npy(ruta, filas))
+            # El JSON va al final: su presencia indica que los .npy están completos.
+            texto = json.dumps({d: [[valor, len(filas)] for valor, filas in por_valor.items()]
+                                for d, por_valor in listas.items()})
+            self._guardar(f'{nombre}.json', lambda ruta: ruta.write_text(texto))
+        return listas
+
+
+def _guardar_npy(ruta, arreglo):
+    with open(ruta, 'wb') as archivo:
+        np.save(archivo, arreglo)
+
+
+def _podar(directorio, conservar):
+    """Borra las instantáneas más viejas, dejando ``CONSERVAR`` versiones (incluida ``conservar``)."""
+    otras = sorted((ruta for ruta in directorio.iterdir() if ruta.is_dir() and ruta != conservar),
+                   key=lambda ruta: ruta.stat().st_mtime, reverse=True)
+    for ruta in otras[CONSERVAR - 1:]:
+        shutil.rmtree(ruta, ignore_errors=True)
+
+
+def ultima_descarga(url, directorio=DIRECTORIO_INSTANTANEAS):
+    """Huella, ETag y Last-Modified de la última descarga de ``url`` con instantánea, o ``None``."""
+    if directorio is None:
+        return None
+    try:
+        registro = json.loads((Path(directorio) / 'descargas.json').read_text()).get(url)
+    except (OSError, ValueError):
+        return None
+    if registro is None or not Instantanea(registro['huella'], directorio).existe('ventas'):
+        return None
+    return registro
+
+
+def registrar_descarga(url, huella, etag, modificado, directorio=DIRECTORIO_INSTANTANEAS):
+    """Recuerda los validadores HTTP de ``url`` para revalidar con 304 tras reiniciar."""
+    if directorio is None:
+        return
+    ruta = Path(directorio) / 'descargas.json'
+    try:
+        registros = json.loads(ruta.read_text())
+    except (OSError, ValueError):
+        registros = {}
+    registros[url] = {'huella': huella, 'etag': etag, 'modificado': modificado}
+    try:
+        Path(directorio).mkdir(parents=True, exist_ok=True)
+        _escribir_atomico(ruta, lambda temporal: temporal.write_text(json.dumps(registros)))
+    except OSError:
+        pass
+
+
+# --- Preparación en segundo plano ---
+
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preparacion')
+_trabajos = {}
+_lock = threading.Lock()
+
+
+def _preparar(df, version):
+    from dashboard.carga import derivado, trm_de
+    from dashboard.catalogo import Catalogo
+    from dashboard.motores import crear_motor
+
+    instantanea = Instantanea(version)
+    motor = derivado(df, 'motor', lambda df: crear_motor(df, instantanea=instantanea,
+                                                         trm=trm_de(df, instantanea)))
+    catalogo = derivado(df, 'catalogo', Catalogo)
+    return motor, catalogo
+
+
+def preparar_en_segundo_plano(df, version):
+    """``Future`` con ``(motor, catalogo)`` de ``df``; se arma una vez por ``version``."""
+    with _lock:
+        futuro = _trabajos.get(version)
+        if futuro is None:
+            futuro = _ejecutor.submit(_preparar, df, version)
+            # Solo se conserva la versión vigente de los datos.
+            _trabajos.clear()
+            _trabajos[version] = futuro
+        return futuro
+
+
+def preparacion_lista(version):
+    """``True`` si el motor y el catálogo de ``version`` ya están armados."""
+    futuro = _trabajos.get(version)
+    return futuro is not None and futuro.done()
@@ -0,0 +1,214 @@
+"""Medición de las etapas de cada ejecución del script.
+
+Un :class:`Perfilador` mide el tiempo (y opcionalmente el pico de memoria con
+``tracemalloc``) de cada etapa con nombre. ``tracemalloc`` es de todo el
+proceso: el pico de una etapa incluye lo que asignen a la vez otras sesiones,
+y el rastreo (que hace más lenta cada asignación) se detiene en cuanto ningún
+perfilador lo necesita.
+
+Al terminar la ejecución el registro queda pendiente y un hilo aparte los
+agrega a ``rendimiento.jsonl`` (que al pasar de ``DASHBOARD_METRICAS_MB`` se
+rota a ``rendimiento.jsonl.1``) y reescribe ``rendimiento.prom`` en formato de
+exposición de Prometheus con los percentiles 50 y 95 recientes por etapa: las
+sesiones no esperan al disco. El directorio se configura con
+``DASHBOARD_METRICAS``; si no se puede escribir, las métricas solo quedan en
+memoria.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DIRECTORIO_METRICAS = Path(os.environ.get('DASHBOARD_METRICAS', 'metricas'))
+# Ejecuciones recientes por etapa que se usan para los percentiles.
+HISTORIAL = 1000
+CUANTILES = (0.5, 0.95)
+# Tamaño desde el que se rota rendimiento.jsonl (se conserva un archivo anterior).
+MAX_BYTES_REGISTRO = int(float(os.environ.get('DASHBOARD_METRICAS_MB', 10)) * 2 ** 20)
+
+_historial = defaultdict(lambda: deque(maxlen=HISTORIAL))
+_totales = defaultdict(lambda: [0, 0.0])
+_lock = threading.Lock()
+# Registros aún sin escribir; un solo hilo los vuelca juntos, fuera de la ejecución del script.
+_pendientes = []
+_volcado = {'programado': False}
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metricas')
+
+# Perfiladores con memoria activos; tracemalloc se detiene al llegar a cero
+# si lo inició este módulo.
+_rastreo = {'activos': 0, 'propio': False}
+_lock_rastreo = threading.Lock()
+
+
+def _tomar_rastreo():
+    with _lock_rastreo:
+        if _rastreo['activos'] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _rastreo['propio'] = True
+        _rastreo['activos'] += 1
+
+
+def _soltar_rastreo():
+    with _lock_rastreo:
+        _rastreo['activos'] -= 1
+        if _rastreo['activos'] == 0 and _rastreo['propio']:
+            tracemalloc.stop()
+            _rastreo['propio'] = False
+
+
+def rss_mb():
+    """Memoria residente actual del proceso en MB (Linux), o ``None``."""
+    try:
+        with open('/proc/self/statm') as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Perfilador:
+    """Mide etapas consecutivas de una ejecución del script.
+
+    ``etapa(nombre)`` cierra la etapa en curso y abre la siguiente;
+    ``finalizar()`` cierra la última y publica el registro. Con ``memoria``
+    cada etapa registra ``pico_proceso_mb``, el pico de todo el proceso
+    durante la etapa.
+    """
+
+    def __init__(self, memoria=False):
+        self.memoria = memoria
+        if memoria:
+            _tomar_rastreo()
+            # Si la ejecución se corta antes de finalizar, el rastreo se suelta al liberar el perfilador.
+            self._soltar = weakref.finalize(self, _soltar_rastreo)
+        self.etapas = {}
+        self._inicio = time.perf_counter()
+        self._actual = None
+        self.finalizado = False
+
+    def etapa(self, nombre):
+        self._cerrar()
+        if self.memoria:
+            tracemalloc.reset_peak()
+            self._memoria_inicial = tracemalloc.get_traced_memory()[0]
+        self._actual = nombre, time.perf_counter()
+
+    def _cerrar(self):
+        if self._actual is None:
+            return
+        nombre, inicio = self._actual
+        medicion = {'segundos': time.perf_counter() - inicio}
+        if self.memoria:
+            medicion['pico_proceso_mb'] = (tracemalloc.get_traced_memory()[1] - self._memoria_inicial) / 2 ** 20
+        # Una etapa con el mismo nombre en varias partes del script se acumula.
+        previa = self.etapas.get(nombre)
+        if previa is not None:
+            medicion['segundos'] += previa['segundos']
+            if self.memoria:
+                medicion['pico_proceso_mb'] = max(medicion['pico_proceso_mb'], previa['pico_proceso_mb'])
+        self.etapas[nombre] = medicion
+        self._actual = None
+
+    def finalizar(self):
+        """Cierra la medición y devuelve el registro publicado."""
+        self._cerrar()
+        self.finalizado = True
+        if self.memoria:
+            self._soltar()
+        registro = {
+            'marca_tiempo': time.time(),
+            'total_segundos': time.perf_counter() - self._inicio,
+            'rss_mb': rss_mb(),
+            'etapas': self.etapas,
+        }
+        with _lock:
+            for nombre, medicion in (*self.etapas.items(), ('total', {'segundos': registro['total_segundos']})):
+                _historial[nombre].append(medicion['segundos'])
+                _totales[nombre][0] += 1
+                _totales[nombre][1] += medicion['segundos']
+            _pendientes.append(registro)
+            if not _volcado['programado']:
+                _volcado['programado'] = True
+                _ejecutor.submit(_volcar)
+        return registro
+
+
+def percentiles():
+    """``{etapa: {'p50': s, 'p95': s, 'n': ejecuciones}}`` sobre el historial reciente."""
+    with _lock:
+        return {
+            nombre: {'p50': float(np.quantile(valores, 0.5)),
+                     'p95': float(np.quantile(valores, 0.95)),
+                     'n': _totales[nombre][0]}
+            for nombre, valores in _historial.items()
+        }
+
+
+def exposicion_prometheus():
+    """Texto de exposición de Prometheus con un ``summary`` por etapa."""
+    lineas = [
+        '# HELP dashboard_etapa_segundos Duración de cada etapa de una ejecución del dashboard.',
+        '# TYPE dashboard_etapa_segundos summary',
+    ]
+    for nombre, valores in sorted(_historial.items()):
+        for cuantil in CUANTILES:
+            lineas.append(f'dashboard_etapa_segundos{{etapa="{nombre}",quantile="{cuantil}"}} '
+                          f'{np.quantile(valores, cuantil):.6f}')
+        cantidad, suma = _totales[nombre]
+        lineas.append(f'dashboard_etapa_segundos_sum{{etapa="{nombre}"}} {suma:.6f}')
+        lineas.append(f'dashboard_etapa_segundos_count{{etapa="{nombre}"}} {cantidad}')
+    return '\n'.join(lineas) + '\n'
+
+
+def _volcar():
+    # Los registros que lleguen mientras se escribe programan el siguiente volcado.
+    with _lock:
+        registros = _pendientes[:]
+        _pendientes.clear()
+        _volcado['programado'] = False
+        exposicion = exposicion_prometheus()
+    try:
+        _escribir(registros, exposicion)
+    except OSError:
+        pass
+
+
+def _escribir(registros, exposicion):
+    DIRECTORIO_METRICAS.mkdir(parents=True, exist_ok=True)
+    ruta = DIRECTORIO_METRICAS / 'rendimiento.jsonl'
+    if ruta.exists() and ruta.stat().st_size >= MAX_BYTES_REGISTRO:
+        ruta.replace(ruta.with_name(ruta.name + '.1'))
+    with open(ruta, 'a') as archivo:
+        archivo.writelines(json.dumps(registro) + '\n' for registro in registros)
+    temporal = DIRECTORIO_METRICAS / 'rendimiento.prom.tmp'
+    temporal.write_text(exposicion)
+    temporal.replace(DIRECTORIO_METRICAS / 'rendimiento.prom')
+
+
+def esperar_escritura():
+    """Espera a que se escriban los registros ya publicados (para scripts y pruebas)."""
+    _ejecutor.submit(lambda: None).result()
+
+
+def tabla_rendimiento(registro):
+    """Tabla para el panel: duración de cada etapa en esta ejecución y percentiles recientes."""
+    historicos = percentiles()
+    filas = []
+    for nombre, medicion in registro['etapas'].items():
+        fila = {
+            'etapa': nombre,
+            'ms': medicion['segundos'] * 1000,
+            'p50 ms': historicos.get(nombre, {}).get('p50', float('nan')) * 1000,
+            'p95 ms': historicos.get(nombre, {}).get('p95', float('nan')) * 1000,
+        }
+        if 'pico_proceso_mb' in medicion:
+            fila['pico MB (proceso)'] = medicion['pico_proceso_mb']
+        filas.append(fila)
+    return pd.DataFrame(filas).set_index('etapa').round(1)
@@ -0,0 +1,109 @@
+"""Tabla diaria de la TRM y conversión de las medidas en pesos a otras monedas.
+
+El export del ERP repetía ``TRM`` y ``pre_tot_US`` en cada línea de venta. En
+su lugar se usa una tabla compacta con una fila por día publicado y una
+columna por moneda (pesos por unidad): ``trm_diaria.csv`` junto al CSV de
+ventas, o la ruta o URL de ``DASHBOARD_TRM``. Las tasas se unen a las ventas
+(o al cubo diario) con un ``merge_asof`` sobre ``fecha``: cada fecha toma la
+última tasa publicada hasta ese día, y las anteriores a la tabla, la primera.
+Si el CSV de ventas aún trae la columna ``TRM``, la carga arma la tabla con
+esas tasas (:func:`dashboard.carga.trm_de`); si no, el dashboard avisa cuando
+hay ventas posteriores al último día de la tabla.
+
+Las medidas convertidas no se guardan: los motores las calculan la primera vez
+que se elige una moneda y conservan sus agregados.
+
+Extracción de la tabla desde un export que aún trae la columna ``TRM``::
+
+    python -m dashboard.monedas ventas_industria_quimica.csv trm_diaria.csv
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MONEDA_BASE = 'COP'
+NOMBRES_MONEDAS = {'COP': 'Pesos', 'USD': 'Dólares'}
+RUTA_TRM = os.environ.get('DASHBOARD_TRM', str(Path(__file__).resolve().parent.parent / 'trm_diaria.csv'))
+
+
+def medida_en(moneda, medida='pre_tot'):
+    """Columna de ``medida`` convertida a ``moneda`` (``'pre_tot_USD'``; en pesos, ``medida``)."""
+    return medida if moneda == MONEDA_BASE else f'{medida}_{moneda}'
+
+
+def moneda_de(medida, base='pre_tot'):
+    """Moneda de una columna de :func:`medida_en` (``'pre_tot_USD'`` → ``'USD'``)."""
+    return MONEDA_BASE if medida == base else medida[len(base) + 1:]
+
+
+class TablaTRM:
+    """Pesos por unidad de cada moneda, una fila por día publicado."""
+
+    def __init__(self, tasas):
+        self.tasas = tasas.astype({'fecha': 'datetime64[ns]'}).sort_values('fecha', ignore_index=True)
+        self.monedas = [MONEDA_BASE, *(columna for columna in self.tasas.columns if columna != 'fecha')]
+
+    @classmethod
+    def leer(cls, origen=RUTA_TRM):
+        return cls(pd.read_csv(origen, parse_dates=['fecha']))
+
+    @classmethod
+    def desde_ventas(cls, df, columna='TRM', moneda='USD'):
+        """Tabla con la ``columna`` de tasas que traen las líneas de venta (una por día)."""
+        tasas = df.groupby(df['fecha'].dt.normalize())[columna].last().dropna()
+        return cls(tasas.rename(moneda).rename_axis('fecha').reset_index())
+
+    @classmethod
+    def unir(cls, tablas):
+        """Tabla con los días de todas ``tablas``; si un día se repite vale la última."""
+        tasas = pd.concat([tabla.tasas for tabla in tablas], ignore_index=True)
+        return cls(tasas.groupby('fecha', as_index=False).last())
+
+    @property
+    def hasta(self):
+        """Último día publicado; las fechas posteriores usan su tasa."""
+        return self.tasas['fecha'].iloc[-1]
+
+    def guardar(self, destino):
+        self.tasas.to_csv(destino, index=False, date_format='%Y-%m-%d')
+
+    def tasas_en(self, fechas, moneda):
+        """Tasa vigente de ``moneda`` en cada una de ``fechas``, como arreglo alineado."""
+        fechas = pd.Series(np.asarray(fechas, dtype='datetime64[ns]'), name='fecha')
+        if moneda == MONEDA_BASE:
+            return np.ones(len(fechas))
+        # merge_asof exige las fechas ordenadas; el cubo y las ventas ya lo están.
+        orden = None if fechas.is_monotonic_increasing else np.argsort(fechas.to_numpy(), kind='stable')
+        izquierda = fechas.to_frame() if orden is None else fechas.iloc[orden].to_frame()
+        unidas = pd.merge_asof(izquierda, self.tasas[['fecha', moneda]], on='fecha', direction='backward')
+        tasas = unidas[moneda].fillna(self.tasas[moneda].iloc[0]).to_numpy()
+        if orden is not None:
+            tasas[orden] = tasas.copy()
+        return tasas
+
+    def convertir(self, valores, fechas, moneda):
+        """``valores`` en pesos expresados en ``moneda`` con la tasa de cada fecha."""
+        return np.asarray(valores, dtype=float) / self.tasas_en(fechas, moneda)
+
+
+_tablas = {}
+_lock = threading.Lock()
+
+
+def tabla_trm(origen=RUTA_TRM):
+    """:class:`TablaTRM` de ``origen``, leída una vez por proceso."""
+    with _lock:
+        if origen not in _tablas:
+            _tablas[origen] = TablaTRM.leer(origen)
+        return _tablas[origen]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('uso: python -m dashboard.monedas VENTAS.csv DESTINO.csv')
+    ventas = pd.read_csv(sys.argv[1], usecols=['fecha', 'TRM'], parse_dates=['fecha'])
+    TablaTRM.desde_ventas(ventas).guardar(sys.argv[2])
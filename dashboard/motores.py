@@ -0,0 +1,468 @@
+"""Motores de consulta intercambiables para el dashboard.
+
+Todas las consultas de la página reciben un ``filtro`` = ``(seleccion,
+fecha_inicio, fecha_final)`` con el mismo significado que en
+:class:`dashboard.filtros.IndiceFiltros`:
+
+- :class:`MotorPandas` es el motor de referencia: índices invertidos y cubo
+  diario en memoria.
+- :class:`MotorDuckDB` expresa las mismas consultas en SQL sobre una base
+  DuckDB embebida. La fuente puede ser un CSV, un Parquet, un directorio de
+  :class:`dashboard.incremental.AlmacenVentas` o un DataFrame. DuckDB empuja
+  los predicados de ``fecha`` y de geografía hasta la lectura y puede
+  procesar fuentes más grandes que la memoria.
+
+Las consultas con ``medida`` aceptan también ``pre_tot`` en otra moneda
+(:func:`dashboard.monedas.medida_en`, p. ej. ``'pre_tot_USD'``). Cada motor
+une la TRM a ``fecha`` con un join *as-of* la primera vez que se pide esa
+moneda y conserva lo convertido.
+
+El motor de la página se elige con ``DASHBOARD_MOTOR`` (``pandas`` por
+defecto). La paridad entre ambos se comprueba con::
+
+    python -m dashboard.motores --paridad [FUENTE]
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from dashboard.almacenamiento import COLUMNAS_DASHBOARD, DIMENSIONES, leer_csv, leer_parquet
+from dashboard.carga import cubo_cargado
+from dashboard.clientes import metricas_rfm
+from dashboard.cubo import FRECUENCIAS, totales_por
+from dashboard.exportar import TAM_BLOQUE, bloques_de
+from dashboard.filtros import IndiceFiltros, _clave, listas_por_dimension
+from dashboard.hll import (COLUMNAS_DISTINTAS, ERROR_DISTINTOS, UMBRAL_EXACTO, BocetosDistintos,
+                          precision_para_error, tabla_boceto)
+from dashboard.indicadores import indicadores_clave
+from dashboard.instantanea import Instantanea
+from dashboard.monedas import medida_en, moneda_de, tabla_trm
+from dashboard.paralelo import construir_cubo_paralelo
+from dashboard.pareto import AnalisisPareto
+from dashboard.prefijos import IndicePrefijos
+
+MOTOR = os.environ.get('DASHBOARD_MOTOR', 'pandas')
+
+
+class MotorPandas:
+    """Motor de referencia en memoria sobre las ventas de ``df``.
+
+    Con una :class:`dashboard.instantanea.Instantanea` el cubo, los bocetos y
+    las listas de los índices se leen de disco si ya estaban guardados. ``trm``
+    es la :class:`dashboard.monedas.TablaTRM` de las conversiones.
+    """
+
+    nombre = 'pandas'
+
+    def __init__(self, df, instantanea=None, trm=None):
+        instantanea = instantanea or Instantanea(None)
+        self.trm = trm or tabla_trm()
+        # La carga por bloques o el almacén incremental pueden traer el cubo ya armado.
+        cubo = cubo_cargado(df)
+        if not df['fecha'].is_monotonic_increasing:
+            df = df.sort_values('fecha', kind='stable', ignore_index=True)
+        self.indice = IndiceFiltros(df, listas=instantanea.listas('indice', lambda: listas_por_dimension(df)))
+        self.cubo = instantanea.tabla('cubo', lambda: construir_cubo_paralelo(df) if cubo is None else cubo)
+        self.indice_cubo = IndiceFiltros(self.cubo, listas=instantanea.listas(
+            'indice_cubo', lambda: listas_por_dimension(self.cubo)))
+        # Totales de rangos de fechas y series de evolución sin recorrer el cubo.
+        self.prefijos = IndicePrefijos(self.cubo)
+        # Los bocetos de distintos solo hacen falta si alguna selección supera el umbral exacto.
+        self.bocetos = None
+        if ERROR_DISTINTOS > 0 and len(df) > UMBRAL_EXACTO:
+            precision = precision_para_error(ERROR_DISTINTOS)
+            self.bocetos = BocetosDistintos({
+                columna: instantanea.tabla(f'boceto_{columna}_p{precision}',
+                                           lambda columna=columna: tabla_boceto(df, columna, precision))
+                for columna in COLUMNAS_DISTINTAS
+            }, precision)
+        # Cubo con las medidas convertidas a cada moneda ya pedida.
+        self._cubos = {}
+        self._lock_monedas = threading.Lock()
+        self._ultimo = None
+
+    def firma(self, filtro):
+        return self.indice.firma(*filtro)
+
+    def filas(self, filtro):
+        """Líneas de venta del filtro (se reutilizan si se piden dos veces seguidas)."""
+        firma = self.firma(filtro)
+        ultimo = self._ultimo
+        if ultimo is not None and ultimo[0] == firma:
+            return ultimo[1]
+        filas = self.indice.filtrar(*filtro)
+        self._ultimo = firma, filas
+        return filas
+
+    def _convertir(self, medida):
+        """Prepara ``medida`` en otra moneda (prefijos y cubo) la primera vez que se pide."""
+        if medida in self.prefijos.medidas:
+            return
+        with self._lock_monedas:
+            if medida in self.prefijos.medidas:
+                return
+            moneda = moneda_de(medida)
+            convertida = self.trm.convertir(self.cubo['pre_tot'], self.cubo['fecha'], moneda)
+            self._cubos[medida] = self.cubo.assign(**{medida: convertida})
+            # Los prefijos van al final: su medida indica que la moneda está lista.
+            tasas = self.trm.tasas_en(self.prefijos.dias(), moneda)
+            self.prefijos.agregar_convertida(medida, 'pre_tot', tasas)
+
+    def cubo_filtrado(self, filtro, medida='pre_tot'):
+        self._convertir(medida)
+        cubo = self._cubos.get(medida, self.cubo)
+        return cubo.iloc[self.indice_cubo.posiciones(*filtro)]
+
+    def _con_medida(self, ventas, medida):
+        # Une la TRM a las líneas de venta por fecha, solo si se pide otra moneda.
+        if medida == 'pre_tot':
+            return ventas
+        convertida = self.trm.convertir(ventas['pre_tot'], ventas['fecha'], moneda_de(medida))
+        return ventas.assign(**{medida: convertida})
+
+    def bloques(self, filtro, tam_bloque=TAM_BLOQUE, medida='pre_tot'):
+        """Líneas de venta del filtro en bloques, sin copiar la selección completa.
+
+        Con ``medida`` en otra moneda, cada bloque lleva además esa columna.
+        """
+        for bloque in bloques_de(self.indice.df, self.indice.posiciones(*filtro), tam_bloque):
+            yield self._con_medida(bloque, medida)
+
+    def indicadores(self, filtro):
+        self._convertir(medida_en('USD'))
+        # Con bocetos, una selección grande no se copia: basta con su tamaño.
+        posiciones = self.indice.posiciones(*filtro)
+        filas = (len(range(*posiciones.indices(len(self.indice.df)))) if isinstance(posiciones, slice)
+                 else len(posiciones))
+        return indicadores_clave(self.prefijos.totales(*filtro), lambda: self.filas(filtro), self.bocetos,
+                                 filtro, filas=filas)
+
+    def serie_temporal(self, filtro, agrupacion, medida='pre_tot'):
+        self._convertir(medida)
+        return self.prefijos.serie_temporal(*filtro, agrupacion, medida)
+
+    def totales_por(self, filtro, columnas, medida='pre_tot'):
+        return totales_por(self.cubo_filtrado(filtro, medida), columnas, medida)
+
+    def cantidad_hasta(self, filtro, columnas, umbral, medida='pre_tot'):
+        """Elementos de ``columnas`` que acumulan hasta ``umbral`` % de ``medida``."""
+        return AnalisisPareto(self.totales_por(filtro, columnas, medida), valor=medida).cantidad_hasta(umbral)
+
+    def clientes(self, filtro, fecha_referencia=None, medida='pre_tot'):
+        return metricas_rfm(self._con_medida(self.filas(filtro), medida), fecha_referencia, medida)
+
+
+# Inicio de cada periodo en DuckDB, paso entre periodos y desplazamiento hasta
+# la etiqueta que usa pandas (fin de semana en domingo, fin de mes, etc.).
+_PERIODOS = {
+    'Dia': ('day', 'INTERVAL 1 DAY', 'INTERVAL 0 DAY'),
+    'Semanal': ('week', 'INTERVAL 1 WEEK', 'INTERVAL 6 DAY'),
+    'Mensual': ('month', 'INTERVAL 1 MONTH', 'INTERVAL 1 MONTH - INTERVAL 1 DAY'),
+    'Trimestral': ('quarter', 'INTERVAL 3 MONTH', 'INTERVAL 3 MONTH - INTERVAL 1 DAY'),
+    'Anual': ('year', 'INTERVAL 1 YEAR', 'INTERVAL 1 YEAR - INTERVAL 1 DAY'),
+}
+assert _PERIODOS.keys() == FRECUENCIAS.keys()
+
+
+def _literal(texto):
+    return "'" + str(texto).replace("'", "''") + "'"
+
+
+def _lector(fuente):
+    """Expresión ``FROM`` de DuckDB para un CSV, Parquet o almacén incremental."""
+    fuente = Path(fuente)
+    if fuente.is_dir():
+        return f"read_parquet({_literal(fuente / 'datos' / '*.parquet')})"
+    if fuente.suffix == '.parquet':
+        return f'read_parquet({_literal(fuente)})'
+    tipos = {'fecha': 'TIMESTAMP', 'num_doc': 'VARCHAR', 'cantidad': 'DOUBLE', 'pre_tot': 'DOUBLE',
+             **{columna: 'VARCHAR' for columna in DIMENSIONES}}
+    tipos_sql = '{' + ', '.join(f'{_literal(c)}: {_literal(t)}' for c, t in tipos.items()) + '}'
+    return f'read_csv({_literal(fuente)}, header = true, types = {tipos_sql})'
+
+
+class MotorDuckDB:
+    """Las consultas del dashboard en SQL sobre una base DuckDB embebida."""
+
+    nombre = 'duckdb'
+
+    def __init__(self, fuente, columnas=COLUMNAS_DASHBOARD, trm=None):
+        import duckdb
+
+        self.trm = trm or tabla_trm()
+        self._conexion = duckdb.connect()
+        # Una conexión de DuckDB no admite consultas simultáneas desde varios hilos.
+        self._lock = threading.Lock()
+        # Los DataFrames registrados solo los ve la conexión que los registra.
+        self._registradas = {'trm': self.trm.tasas}
+        if isinstance(fuente, pd.DataFrame):
+            self._registradas['fuente'] = fuente[columnas]
+            origen = 'fuente'
+        else:
+            origen = _lector(fuente)
+        for nombre, tabla in self._registradas.items():
+            self._conexion.register(nombre, tabla)
+        seleccion = ', '.join(f'"{columna}"' for columna in columnas)
+        self._conexion.execute(f'CREATE VIEW ventas AS SELECT {seleccion} FROM {origen}')
+        self._dominios = {}
+        self._vistas = {'pre_tot': 'ventas'}
+
+    def _vista(self, medida):
+        """Vista con la columna ``medida``: ``ventas`` o, en otra moneda, con la TRM unida por fecha."""
+        if medida not in self._vistas:
+            moneda = moneda_de(medida)
+            nombre = f'ventas_{moneda}'
+            # Antes de la primera tasa publicada se usa esa misma tasa, como en TablaTRM.tasas_en.
+            primera = float(self.trm.tasas[moneda].iloc[0])
+            with self._lock:
+                self._conexion.execute(f"""
+                    CREATE OR REPLACE VIEW "{nombre}" AS
+                    SELECT ventas.*, ventas.pre_tot / coalesce(trm."{moneda}", {primera!r}) AS "{medida}"
+                    FROM ventas ASOF LEFT JOIN trm ON ventas.fecha >= trm.fecha""")
+            self._vistas[medida] = nombre
+        return f'"{self._vistas[medida]}"'
+
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            return self._conexion.execute(sql, list(parametros)).df()
+
+    def _fila(self, sql, parametros=()):
+        with self._lock:
+            return self._conexion.execute(sql, list(parametros)).fetchone()
+
+    def dominio(self, dimension):
+        """Valores distintos de ``dimension`` (``None`` representa los nulos)."""
+        if dimension not in self._dominios:
+            valores = self._consultar(f'SELECT DISTINCT "{dimension}" AS v FROM ventas')['v']
+            self._dominios[dimension] = {_clave(valor) for valor in valores}
+        return self._dominios[dimension]
+
+    def _es_todo(self, dimension, valores):
+        return {_clave(valor) for valor in valores} >= self.dominio(dimension)
+
+    def firma(self, filtro):
+        seleccion, fecha_inicio, fecha_final = filtro
+        dimensiones = tuple(
+            (dimension, '*' if self._es_todo(dimension, valores) else
+             tuple(sorted({_clave(valor) for valor in valores}, key=lambda v: (v is None, str(v)))))
+            for dimension, valores in sorted(seleccion.items())
+        )
+        fechas = tuple(None if fecha is None else pd.Timestamp(fecha) for fecha in (fecha_inicio, fecha_final))
+        return fechas, dimensiones
+
+    def _donde(self, filtro, no_nulas=()):
+        """Cláusula ``WHERE`` y parámetros equivalentes a ``IndiceFiltros.posiciones``."""
+        seleccion, fecha_inicio, fecha_final = filtro
+        condiciones, parametros = [], []
+        if fecha_inicio is not None:
+            condiciones.append('fecha >= ?')
+            parametros.append(pd.Timestamp(fecha_inicio))
+        if fecha_final is not None:
+            condiciones.append('fecha <= ?')
+            parametros.append(pd.Timestamp(fecha_final))
+        for dimension, valores in seleccion.items():
+            if self._es_todo(dimension, valores):
+                continue
+            claves = {_clave(valor) for valor in valores}
+            presentes = sorted(str(valor) for valor in claves if valor is not None)
+            partes = []
+            if presentes:
+                partes.append(f'"{dimension}" IN ({", ".join("?" * len(presentes))})')
+                parametros.extend(presentes)
+            if None in claves:
+                partes.append(f'"{dimension}" IS NULL')
+            condiciones.append('(' + ' OR '.join(partes) + ')' if partes else 'FALSE')
+        condiciones.extend(f'"{columna}" IS NOT NULL' for columna in no_nulas)
+        return ('WHERE ' + ' AND '.join(condiciones) if condiciones else ''), parametros
+
+    def bloques(self, filtro, tam_bloque=TAM_BLOQUE, medida='pre_tot'):
+        """Líneas de venta del filtro como lotes de Arrow.
+
+        Se leen con un cursor propio: las demás consultas no esperan a que se
+        consuma (o se abandone) el generador.
+        """
+        donde, parametros = self._donde(filtro)
+        vista = self._vista(medida)
+        with self._lock:
+            cursor = self._conexion.cursor()
+        try:
+            for nombre, tabla in self._registradas.items():
+                cursor.register(nombre, tabla)
+            lector = cursor.execute(f'SELECT * FROM {vista} {donde} ORDER BY fecha',
+                                    parametros).fetch_record_batch(tam_bloque)
+            vacio = True
+            for lote in lector:
+                vacio = False
+                yield lote
+            if vacio:
+                yield lector.schema.empty_table()
+        finally:
+            cursor.close()
+
+    def indicadores(self, filtro):
+        donde, parametros = self._donde(filtro)
+        dolares = medida_en('USD')
+        ventas_pesos, ventas_dolares, clientes, productos = self._fila(f"""
+            SELECT coalesce(sum(pre_tot), 0), coalesce(sum("{dolares}"), 0),
+                   count(DISTINCT cliente), count(DISTINCT item)
+            FROM {self._vista(dolares)} {donde}""", parametros)
+        return {
+            'ventas_pesos': ventas_pesos,
+            'ventas_dolares': ventas_dolares,
+            'clientes_unicos': clientes,
+            'productos_vendidos': productos,
+            'distintos_aproximados': False,
+        }
+
+    def serie_temporal(self, filtro, agrupacion, medida='pre_tot'):
+        unidad, paso, desplazamiento = _PERIODOS[agrupacion]
+        donde, parametros = self._donde(filtro)
+        # Los periodos sin ventas aparecen con 0, como en pd.Grouper.
+        serie = self._consultar(f"""
+            WITH periodos AS (
+                SELECT date_trunc('{unidad}', fecha) AS inicio, sum("{medida}") AS valor
+                FROM {self._vista(medida)} {donde} GROUP BY 1
+            ), rango AS (
+                SELECT unnest(generate_series(min(inicio), max(inicio), {paso})) AS inicio FROM periodos
+            )
+            SELECT CAST(rango.inicio + {desplazamiento} AS TIMESTAMP) AS fecha,
+                   coalesce(periodos.valor, 0) AS "{medida}"
+            FROM rango LEFT JOIN periodos USING (inicio)
+            ORDER BY fecha""", parametros)
+        serie['fecha'] = serie['fecha'].astype('datetime64[ns]')
+        return serie
+
+    def totales_por(self, filtro, columnas, medida='pre_tot'):
+        donde, parametros = self._donde(filtro, no_nulas=columnas)
+        lista = ', '.join(f'"{columna}"' for columna in columnas)
+        return self._consultar(f"""
+            SELECT {lista}, sum("{medida}") AS "{medida}"
+            FROM {self._vista(medida)} {donde} GROUP BY {lista} ORDER BY {lista}""", parametros)
+
+    def cantidad_hasta(self, filtro, columnas, umbral, medida='pre_tot'):
+        """Elementos de ``columnas`` que acumulan hasta ``umbral`` % de ``medida``."""
+        donde, parametros = self._donde(filtro, no_nulas=columnas)
+        lista = ', '.join(f'"{columna}"' for columna in columnas)
+        return self._fila(f"""
+            WITH totales AS (
+                SELECT sum("{medida}") AS valor FROM {self._vista(medida)} {donde} GROUP BY {lista}
+            ), acumulado AS (
+                SELECT sum(valor) OVER (ORDER BY valor DESC ROWS UNBOUNDED PRECEDING)
+                       / sum(valor) OVER () * 100 AS porcentaje
+                FROM totales
+            )
+            SELECT count(*) FROM acumulado WHERE porcentaje <= ?""", [*parametros, umbral])[0]
+
+    def clientes(self, filtro, fecha_referencia=None, medida='pre_tot'):
+        donde, parametros = self._donde(filtro, no_nulas=['cliente'])
+        rfm = self._consultar(f"""
+            SELECT cliente,
+                   arg_min(nom_cli, fecha) AS nom_cli,
+                   sum("{medida}") AS ventas_totales,
+                   count(DISTINCT num_doc) AS frecuencia_compras,
+                   max(fecha) AS ultima_compra
+            FROM {self._vista(medida)} {donde} GROUP BY cliente ORDER BY cliente""", parametros)
+        rfm['ultima_compra'] = rfm['ultima_compra'].astype('datetime64[ns]')
+        if fecha_referencia is None:
+            fecha_referencia = rfm['ultima_compra'].max()
+        rfm['recencia_dias'] = (pd.Timestamp(fecha_referencia) - rfm['ultima_compra']).dt.days
+        return rfm
+
+
+def crear_motor(df, nombre=MOTOR, instantanea=None, trm=None):
+    """Motor ``nombre`` (``'pandas'`` o ``'duckdb'``) sobre las ventas cargadas.
+
+    ``instantanea`` solo la usa el motor de pandas; DuckDB no guarda estructuras propias.
+    """
+    if nombre == 'duckdb':
+        return MotorDuckDB(df, trm=trm)
+    if nombre == 'pandas':
+        return MotorPandas(df, instantanea, trm)
+    raise ValueError(f'Motor desconocido: {nombre!r}')
+
+
+# --- Paridad entre motores ---
+
+def _filtros_de_prueba(df):
+    departamentos = df['departamento'].dropna().unique().tolist()
+    subgrupos = df['nom_sub'].dropna().unique().tolist()
+    fin = df['fecha'].max()
+    return {
+        'todo': ({}, None, None),
+        'acotado': ({'departamento': departamentos[::2]}, fin - pd.Timedelta(days=365), fin),
+        'subgrupos': ({'nom_sub': subgrupos[:3], 'departamento': [*departamentos, None]}, None, None),
+        'vacio': ({'ciudad': []}, None, None),
+    }
+
+
+def _iguales(esperado, obtenido):
+    if isinstance(esperado, bool) or obtenido is None:
+        return esperado == obtenido
+    return esperado == obtenido or abs(esperado - obtenido) <= 1e-9 * abs(esperado)
+
+
+def _diferencias(nombre, esperado, obtenido):
+    if isinstance(esperado, dict):
+        return [f'{nombre}.{clave}: {esperado[clave]!r} != {obtenido.get(clave)!r}'
+                for clave in esperado if not _iguales(esperado[clave], obtenido.get(clave))]
+    if not isinstance(esperado, pd.DataFrame):
+        return [] if _iguales(esperado, obtenido) else [f'{nombre}: {esperado!r} != {obtenido!r}']
+    claves = [c for c in esperado.columns if not pd.api.types.is_float_dtype(esperado[c])]
+
+    def normalizar(df):
+        df = df.astype({c: str for c in claves if not pd.api.types.is_datetime64_any_dtype(df[c])})
+        return df.sort_values(claves, ignore_index=True) if claves else df.reset_index(drop=True)
+
+    try:
+        pd.testing.assert_frame_equal(normalizar(esperado), normalizar(obtenido[esperado.columns]),
+                                      check_dtype=False, rtol=1e-9)
+    except (AssertionError, KeyError) as error:
+        return [f'{nombre}: ' + str(error).strip().splitlines()[0]]
+    return []
+
+
+def verificar_paridad(referencia, motor, filtros):
+    """Compara las consultas de ``motor`` con las de ``referencia``; devuelve las diferencias."""
+    diferencias = []
+    dolares = medida_en('USD')
+    for nombre, filtro in filtros.items():
+        consultas = {
+            'indicadores': lambda m: m.indicadores(filtro),
+            **{f'serie_{a}': (lambda m, a=a: m.serie_temporal(filtro, a)) for a in FRECUENCIAS},
+            'totales_subgrupo': lambda m: m.totales_por(filtro, ['nom_sub']),
+            'totales_producto': lambda m: m.totales_por(filtro, ['nom_sub', 'des_item']),
+            **{f'pareto_{u}': (lambda m, u=u: m.cantidad_hasta(filtro, ['nom_sub', 'des_item'], u))
+               for u in (50, 80, 95)},
+            'clientes': lambda m: m.clientes(filtro, filtro[2]),
+            'serie_Mensual_USD': lambda m: m.serie_temporal(filtro, 'Mensual', dolares),
+            'totales_producto_USD': lambda m: m.totales_por(filtro, ['nom_sub', 'des_item'], dolares),
+            'pareto_80_USD': lambda m: m.cantidad_hasta(filtro, ['nom_sub', 'des_item'], 80, dolares),
+            'clientes_USD': lambda m: m.clientes(filtro, filtro[2], dolares),
+        }
+        for consulta, ejecutar in consultas.items():
+            diferencias += _diferencias(f'{nombre}/{consulta}', ejecutar(referencia), ejecutar(motor))
+    return diferencias
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != '--paridad':
+        sys.exit('uso: python -m dashboard.motores --paridad [FUENTE]')
+    fuente = Path(sys.argv[2] if len(sys.argv) > 2 else 'ventas_industria_quimica.csv')
+    if fuente.is_dir():
+        from dashboard.incremental import AlmacenVentas
+        ventas = AlmacenVentas(fuente).leer(COLUMNAS_DASHBOARD)
+    elif fuente.suffix == '.parquet':
+        ventas = leer_parquet(fuente, COLUMNAS_DASHBOARD)
+    else:
+        ventas = leer_csv(fuente, COLUMNAS_DASHBOARD)
+    # Los indicadores se comparan exactos, sin bocetos aproximados.
+    referencia = MotorPandas(ventas)
+    referencia.bocetos = None
+    diferencias = verificar_paridad(referencia, MotorDuckDB(fuente), _filtros_de_prueba(ventas))
+    for diferencia in diferencias:
+        print(diferencia)
+    print(f'{len(diferencias)} diferencias')
+    sys.exit(1 if diferencias else 0)
@@ -0,0 +1,35 @@
+"""Reducción de series largas para graficar (Largest-Triangle-Three-Buckets)."""
+import numpy as np
+
+
+def lttb(x, y, n_puntos):
+    """Índices de los ``n_puntos`` de ``(x, y)`` que mejor conservan la forma de la serie.
+
+    Siempre incluye el primer y el último punto. Si la serie ya tiene
+    ``n_puntos`` o menos se devuelven todos los índices.
+    """
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_puntos >= n or n_puntos < 3:
+        return np.arange(n)
+
+    # Cubetas del punto 1 al n-2; el primero y el último se fijan.
+    bordes = np.linspace(1, n - 1, n_puntos - 1).astype(np.intp)
+    seleccion = np.empty(n_puntos, dtype=np.intp)
+    seleccion[0], seleccion[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Promedio de la cubeta siguiente (o el último punto al final).
+        siguiente_inicio, siguiente_fin = fin, bordes[i + 2] if i + 2 < len(bordes) else n
+        x_medio = x[siguiente_inicio:siguiente_fin].mean()
+        y_medio = y[siguiente_inicio:siguiente_fin].mean()
+        area = np.abs((x[anterior] - x_medio) * (y[inicio:fin] - y[anterior]) -
+                      (x[anterior] - x[inicio:fin]) * (y_medio - y[anterior]))
+        anterior = inicio + int(np.argmax(area))
+        seleccion[i + 1] = anterior
+    return seleccion
@@ -0,0 +1,52 @@
+"""Análisis de Pareto / ABC vectorizado.
+
+Un solo ordenamiento y una suma acumulada bastan para responder cualquier
+umbral: los cortes se buscan con ``searchsorted`` sobre el porcentaje
+acumulado, sin volver a recorrer las filas. Sirve igual para subgrupos,
+productos y clientes.
+"""
+from string import ascii_uppercase
+
+import numpy as np
+
+UMBRALES_ABC = (80, 95)
+
+
+class AnalisisPareto:
+    """Ranking de ``df`` por ``valor`` con participación y porcentaje acumulado.
+
+    ``tabla`` queda ordenada de mayor a menor con las columnas
+    ``porcentaje_del_total``, ``porcentaje_acumulado`` (ambas en %) y
+    ``clase`` (A, B, C... según ``umbrales_abc``, crecientes: una clase más
+    que umbrales).
+    """
+
+    def __init__(self, df, valor='pre_tot', umbrales_abc=UMBRALES_ABC):
+        if list(umbrales_abc) != sorted(umbrales_abc) or len(umbrales_abc) >= len(ascii_uppercase):
+            raise ValueError(f'umbrales_abc debe ser creciente y tener menos de {len(ascii_uppercase)} '
+                             f'valores: {umbrales_abc!r}')
+        tabla = df.sort_values(valor, ascending=False, kind='stable', ignore_index=True)
+        self.valor = valor
+        self.total = tabla[valor].sum()
+        self._acumulado = tabla[valor].cumsum().to_numpy() / self.total * 100
+        tabla['porcentaje_del_total'] = tabla[valor] / self.total * 100
+        tabla['porcentaje_acumulado'] = self._acumulado
+        self.tabla = tabla
+        cortes = [self.corte(umbral) for umbral in umbrales_abc]
+        clases = np.searchsorted(cortes, np.arange(len(tabla)), side='right')
+        tabla['clase'] = np.array(list(ascii_uppercase[:len(cortes) + 1]))[clases]
+
+    def __len__(self):
+        return len(self.tabla)
+
+    def cantidad_hasta(self, umbral):
+        """Elementos cuyo porcentaje acumulado no supera ``umbral`` (en %)."""
+        return int(np.searchsorted(self._acumulado, umbral, side='right'))
+
+    def corte(self, umbral):
+        """Elementos necesarios para alcanzar ``umbral`` (incluye el que lo cruza)."""
+        return min(int(np.searchsorted(self._acumulado, umbral, side='left')) + 1, len(self.tabla))
+
+    def principales(self, umbral):
+        """Filas necesarias para alcanzar ``umbral``, listas para mostrar."""
+        return self.tabla.iloc[:self.corte(umbral)]
@@ -0,0 +1,138 @@
+"""Índice de sumas acumuladas por día para totales de cualquier rango de fechas.
+
+A partir del cubo diario se guardan, para cada celda (departamento, ciudad,
+nom_sub), sus días con ventas y la suma acumulada de cada medida. El total de
+un rango ``fecha_inicio`` – ``fecha_final`` en una celda es la diferencia de
+dos posiciones encontradas con ``searchsorted``, así que un filtro solo suma
+esa diferencia sobre las celdas elegidas: mover las fechas no recorre líneas
+de venta ni filas del cubo. Las series de ``agrupacion_tiempo`` se arman con
+los totales diarios de esas mismas celdas.
+
+Las medidas en otra moneda (:meth:`IndicePrefijos.agregar_convertida`) se
+derivan de los totales diarios en pesos: la TRM es una por día, así que
+convertir el total del día equivale a convertir cada venta.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cubo import FRECUENCIAS, MEDIDAS
+from dashboard.filtros import DIMENSIONES_FILTRO, _clave
+
+_UN_DIA = pd.Timedelta(days=1)
+
+
+class IndicePrefijos:
+    """Sumas acumuladas diarias de ``medidas`` por celda de ``dimensiones`` del ``cubo``."""
+
+    def __init__(self, cubo, dimensiones=DIMENSIONES_FILTRO, medidas=MEDIDAS):
+        self.dimensiones = tuple(dimensiones)
+        self.medidas = tuple(medidas)
+        dias = cubo['fecha'].dt.normalize()
+        self.origen = dias.min() if len(cubo) else pd.Timestamp(0)
+        dia = ((dias - self.origen) // _UN_DIA).to_numpy(dtype=np.int64)
+        self.num_dias = int(dia.max()) + 1 if len(cubo) else 0
+
+        # Cada dimensión como códigos enteros; los nulos llevan el último código.
+        codigos, self._valores = {}, {}
+        for dimension in self.dimensiones:
+            codigo, valores = pd.factorize(cubo[dimension], use_na_sentinel=True)
+            codigos[dimension] = np.where(codigo < 0, len(valores), codigo)
+            self._valores[dimension] = [_clave(valor) for valor in valores] + [None]
+        tabla = pd.DataFrame({**codigos, 'dia': dia, **{m: cubo[m].to_numpy() for m in self.medidas}})
+        # Una entrada por (celda, día), ordenadas por celda y luego por día.
+        diario = tabla.groupby([*self.dimensiones, 'dia'], sort=True)[list(self.medidas)].sum().reset_index()
+        celda = diario.groupby(list(self.dimensiones), sort=True).ngroup().to_numpy()
+        primeras = np.flatnonzero(np.r_[True, celda[1:] != celda[:-1]]) if len(celda) else celda
+        self._codigos_celda = {d: diario[d].to_numpy()[primeras] for d in self.dimensiones}
+        self.num_celdas = len(primeras)
+
+        self._dias = diario['dia'].to_numpy()
+        # Clave creciente celda * num_dias + día: un searchsorted ubica cualquier (celda, día).
+        self._claves = celda.astype(np.int64) * self.num_dias + self._dias
+        self._valores_diarios = {m: diario[m].to_numpy() for m in self.medidas}
+        self._acumulado = {m: np.concatenate([[0.0], np.cumsum(diario[m].to_numpy())]) for m in self.medidas}
+        # Totales diarios de todas las celdas, para el caso sin filtros geográficos.
+        self._dias_con_ventas = np.bincount(self._dias, minlength=self.num_dias) > 0
+        self._total_diario = {m: np.bincount(self._dias, weights=valores, minlength=self.num_dias)
+                              for m, valores in self._valores_diarios.items()}
+
+    def dias(self):
+        """Fecha de cada día del índice, desde ``origen``."""
+        return pd.date_range(self.origen, periods=self.num_dias, freq='D')
+
+    def agregar_convertida(self, nombre, medida, tasas):
+        """Agrega la medida ``nombre`` = ``medida`` / ``tasas`` del día de cada entrada.
+
+        ``tasas`` tiene una tasa por día de :meth:`dias`. Los diccionarios se
+        reemplazan en vez de modificarse, porque otras sesiones pueden estar leyéndolos.
+        """
+        valores = self._valores_diarios[medida] / np.asarray(tasas, dtype=float)[self._dias]
+        self._valores_diarios = {**self._valores_diarios, nombre: valores}
+        self._acumulado = {**self._acumulado, nombre: np.concatenate([[0.0], np.cumsum(valores)])}
+        self._total_diario = {**self._total_diario,
+                              nombre: np.bincount(self._dias, weights=valores, minlength=self.num_dias)}
+        self.medidas = (*self.medidas, nombre)
+
+    def celdas(self, seleccion):
+        """Celdas que cumplen ``seleccion`` (las dimensiones ausentes no filtran)."""
+        mascara = np.ones(self.num_celdas, dtype=bool)
+        for dimension, valores in seleccion.items():
+            claves = {_clave(valor) for valor in valores}
+            permitidos = np.array([valor in claves for valor in self._valores[dimension]])
+            mascara &= permitidos[self._codigos_celda[dimension]]
+        return np.flatnonzero(mascara)
+
+    def _dias_del_rango(self, fecha_inicio, fecha_final):
+        # Mismo criterio que filtrar el cubo: un día entra si su medianoche está en el rango.
+        inicio = 0 if fecha_inicio is None else max(
+            0, math.ceil((pd.Timestamp(fecha_inicio) - self.origen) / _UN_DIA))
+        fin = self.num_dias - 1 if fecha_final is None else min(
+            self.num_dias - 1, math.floor((pd.Timestamp(fecha_final) - self.origen) / _UN_DIA))
+        return inicio, fin
+
+    def _tramos(self, seleccion, fecha_inicio, fecha_final):
+        """Celdas elegidas, días del rango y límites ``[desde, hasta)`` de sus entradas."""
+        celdas = self.celdas(seleccion)
+        inicio, fin = self._dias_del_rango(fecha_inicio, fecha_final)
+        if inicio > fin:
+            celdas = celdas[:0]
+        base = celdas.astype(np.int64) * self.num_dias
+        desde = np.searchsorted(self._claves, base + inicio, side='left')
+        hasta = np.searchsorted(self._claves, base + fin, side='right')
+        return celdas, (inicio, fin), desde, hasta
+
+    def totales(self, seleccion, fecha_inicio=None, fecha_final=None):
+        """Total de cada medida en la selección: dos búsquedas y una resta por celda."""
+        _, _, desde, hasta = self._tramos(seleccion, fecha_inicio, fecha_final)
+        return {m: (acumulado[hasta] - acumulado[desde]).sum() for m, acumulado in self._acumulado.items()}
+
+    def diario(self, seleccion, fecha_inicio=None, fecha_final=None, medida='pre_tot'):
+        """Total diario de ``medida`` desde el primer hasta el último día con ventas de la selección."""
+        celdas, (inicio, fin), desde, hasta = self._tramos(seleccion, fecha_inicio, fecha_final)
+        if len(celdas) == self.num_celdas and inicio <= fin:
+            presentes = self._dias_con_ventas[inicio:fin + 1]
+            valores = self._total_diario[medida][inicio:fin + 1]
+        else:
+            largos = hasta - desde
+            # Posiciones de todas las entradas de los tramos, sin bucle por celda.
+            posiciones = np.repeat(desde - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+            dias = self._dias[posiciones] - inicio
+            largo = max(fin - inicio + 1, 0)
+            presentes = np.bincount(dias, minlength=largo) > 0
+            valores = np.bincount(dias, weights=self._valores_diarios[medida][posiciones], minlength=largo)
+        con_ventas = np.flatnonzero(presentes)
+        if not len(con_ventas):
+            return pd.Series([], index=pd.DatetimeIndex([], name='fecha'), name=medida, dtype=float)
+        primero, ultimo = con_ventas[0], con_ventas[-1]
+        fechas = pd.date_range(self.origen + (inicio + primero) * _UN_DIA, periods=ultimo - primero + 1,
+                               freq='D', name='fecha')
+        return pd.Series(valores[primero:ultimo + 1], index=fechas, name=medida)
+
+    def serie_temporal(self, seleccion, fecha_inicio, fecha_final, agrupacion, medida='pre_tot'):
+        """Como :func:`dashboard.cubo.serie_temporal`, a partir de los totales diarios."""
+        return (self.diario(seleccion, fecha_inicio, fecha_final, medida)
+                .resample(FRECUENCIAS[agrupacion])
+                .sum()
+                .reset_index())
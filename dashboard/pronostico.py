@@ -0,0 +1,156 @@
+"""Pronóstico mensual de ventas totales y por subgrupo, calculado en segundo plano.
+
+Todas las series mensuales (el total y una por ``nom_sub``) se ajustan a la
+vez con Holt-Winters aditivo (nivel, tendencia y estacionalidad de 12 meses)
+en numpy: la recursión avanza mes a mes sobre una matriz de series × valores
+de los parámetros de suavizado, y cada serie se queda con la combinación de
+menor error de un paso. Con menos de dos años completos se omite la
+estacionalidad.
+
+El ajuste corre en un hilo aparte apenas se cargan los datos y se guarda por
+versión del conjunto de datos (:func:`dashboard.carga.version_de`),
+así que la página solo superpone resultados ya calculados. El horizonte se
+configura con ``DASHBOARD_HORIZONTE_PRONOSTICO`` (6 meses por defecto).
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+HORIZONTE = int(os.environ.get('DASHBOARD_HORIZONTE_PRONOSTICO', 6))
+PERIODO = 12
+# Cuantil normal del intervalo de predicción del 80 %.
+Z_INTERVALO = 1.2816
+
+# Valores candidatos de alfa (nivel), beta (tendencia) y gamma (estacionalidad).
+ALFAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.01, 0.05, 0.15, 0.3)
+GAMMAS = (0.05, 0.15, 0.3, 0.5)
+
+
+def holt_winters(series, horizonte=HORIZONTE, periodo=PERIODO):
+    """Ajusta Holt-Winters aditivo a cada fila de ``series`` (series × meses).
+
+    Devuelve ``(pronostico, varianza)``, ambos de forma (series × horizonte):
+    la predicción de los próximos ``horizonte`` meses y la varianza de su error.
+    """
+    series = np.asarray(series, dtype=float)
+    n_series, n_meses = series.shape
+    estacional = n_meses >= 2 * periodo
+    gammas = GAMMAS if estacional else (0.0,)
+    parametros = np.array(list(itertools.product(ALFAS, BETAS, gammas)))
+    # Forma (combinaciones, 1) para operar contra (combinaciones, series).
+    alfa, beta, gamma = (parametros[:, [i]] for i in range(3))
+    n_comb = len(parametros)
+
+    if estacional:
+        primera, segunda = series[:, :periodo].mean(axis=1), series[:, periodo:2 * periodo].mean(axis=1)
+        nivel = np.broadcast_to(primera, (n_comb, n_series)).copy()
+        tendencia = np.broadcast_to((segunda - primera) / periodo, (n_comb, n_series)).copy()
+        estaciones = np.broadcast_to(series[:, :periodo] - primera[:, None], (n_comb, n_series, periodo)).copy()
+        inicio = periodo
+    else:
+        nivel = np.broadcast_to(series[:, 0], (n_comb, n_series)).copy()
+        tendencia = np.broadcast_to(series[:, 1] - series[:, 0] if n_meses > 1 else 0.0,
+                                    (n_comb, n_series)).copy()
+        estaciones = np.zeros((n_comb, n_series, periodo))
+        inicio = 1
+    errores = np.zeros((n_comb, n_series))
+    for t in range(inicio, n_meses):
+        y = series[:, t]
+        estacion = estaciones[:, :, t % periodo]
+        errores += (y - (nivel + tendencia + estacion)) ** 2
+        nuevo_nivel = alfa * (y - estacion) + (1 - alfa) * (nivel + tendencia)
+        tendencia = beta * (nuevo_nivel - nivel) + (1 - beta) * tendencia
+        estaciones[:, :, t % periodo] = gamma * (y - nuevo_nivel) + (1 - gamma) * estacion
+        nivel = nuevo_nivel
+
+    mejor = errores.argmin(axis=0)
+    filas = np.arange(n_series)
+    pasos = np.arange(1, horizonte + 1)
+    pronostico = (nivel[mejor, filas][:, None] + pasos * tendencia[mejor, filas][:, None]
+                  + estaciones[mejor, filas][:, (n_meses + pasos - 1) % periodo])
+    sigma2 = errores[mejor, filas] / max(n_meses - inicio, 1)
+    # Varianza del error a h pasos del modelo aditivo: sigma² (1 + sum_{j<h} c_j²).
+    a, b, g = (parametros[mejor, i][:, None] for i in range(3))
+    j = pasos[:-1]
+    c = a * (1 + j * b) + g * (j % periodo == 0)
+    varianza = sigma2[:, None] * (1 + np.concatenate([np.zeros((n_series, 1)), np.cumsum(c ** 2, axis=1)], axis=1))
+    return pronostico, varianza
+
+
+def series_mensuales(df, medida='pre_tot'):
+    """Ventas mensuales completas: columna ``'total'`` y una por subgrupo, índice de fin de mes."""
+    mes = pd.Grouper(key='fecha', freq='ME')
+    por_subgrupo = df.groupby([mes, 'nom_sub'], observed=True)[medida].sum().unstack('nom_sub')
+    total = df.groupby(mes)[medida].sum()
+    series = por_subgrupo.reindex(total.index).fillna(0.0)
+    series.columns = series.columns.astype(object)
+    series.insert(0, 'total', total)
+    # Los meses incompletos de los extremos subestimarían el nivel.
+    primero, ultimo = df['fecha'].min(), df['fecha'].max()
+    if primero.day != 1:
+        series = series.iloc[1:]
+    if ultimo.normalize() != ultimo.normalize() + pd.offsets.MonthEnd(0):
+        series = series.iloc[:-1]
+    return series
+
+
+class Pronosticos:
+    """Pronósticos del total y de cada subgrupo para los meses siguientes a los datos."""
+
+    def __init__(self, fechas, nombres, pronostico, varianza, fin_datos):
+        self.fechas = fechas
+        self.nombres = list(nombres)
+        self.pronostico = pronostico
+        self.varianza = varianza
+        self.fin_datos = fin_datos
+        self._filas = {nombre: i for i, nombre in enumerate(self.nombres)}
+
+    @classmethod
+    def desde_ventas(cls, df, horizonte=HORIZONTE, medida='pre_tot'):
+        series = series_mensuales(df, medida)
+        pronostico, varianza = holt_winters(series.to_numpy().T, horizonte)
+        fechas = pd.date_range(series.index[-1] + pd.offsets.MonthEnd(1), periods=horizonte, freq='ME',
+                               name='fecha')
+        return cls(fechas, series.columns, pronostico, varianza, df['fecha'].max())
+
+    def para(self, subgrupos=None):
+        """Pronóstico con banda del 80 % del total (``None``) o de la suma de ``subgrupos``.
+
+        Las varianzas de los subgrupos se suman como si sus errores fueran
+        independientes. Los subgrupos sin serie no aportan.
+        """
+        if subgrupos is None:
+            filas = [self._filas['total']]
+        else:
+            filas = [self._filas[s] for s in subgrupos if s in self._filas and s != 'total']
+        pronostico = self.pronostico[filas].sum(axis=0)
+        desvio = np.sqrt(self.varianza[filas].sum(axis=0))
+        return pd.DataFrame({
+            'fecha': self.fechas,
+            'pronostico': pronostico,
+            'inferior': np.maximum(pronostico - Z_INTERVALO * desvio, 0.0),
+            'superior': pronostico + Z_INTERVALO * desvio,
+        })
+
+
+# Un solo hilo: los ajustes no compiten entre sí por la CPU de las sesiones.
+_ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pronosticos')
+_trabajos = {}
+_lock = threading.Lock()
+
+
+def pronosticos_en_segundo_plano(df, version, horizonte=HORIZONTE):
+    """``Future`` con los :class:`Pronosticos` de ``df``; se calcula una vez por ``version``."""
+    with _lock:
+        futuro = _trabajos.get(version)
+        if futuro is None:
+            futuro = _ejecutor.submit(Pronosticos.desde_ventas, df, horizonte)
+            # Solo se conserva la versión vigente de los datos.
+            _trabajos.clear()
+            _trabajos[version] = futuro
+        return futuro
@@ -0,0 +1,70 @@
+"""Generador de ventas sintéticas con el esquema de ``ventas_industria_quimica.csv``.
+
+Se usa para medir el rendimiento con volúmenes mayores que el archivo real.
+Las cardinalidades de las dimensiones imitan las del archivo original y las
+ventas por cliente y por producto siguen una distribución de cola larga.
+"""
+import numpy as np
+import pandas as pd
+
+from dashboard.almacenamiento import tipar_ventas
+
+N_DEPARTAMENTOS = 16
+N_CIUDADES = 49
+N_SUBGRUPOS = 23
+N_PRODUCTOS = 248
+N_VENDEDORES = 17
+CENTROS_COSTO = ['BIOINDUSTRIA', 'ESPECIALIDADES QUIMICAS', 'ALIMENTOS']
+
+
+def _zipf(generador, n_valores, n, exponente=1.1):
+    # Índices en [0, n_valores) con probabilidad decreciente (cola larga).
+    pesos = 1 / np.arange(1, n_valores + 1) ** exponente
+    return generador.choice(n_valores, size=n, p=pesos / pesos.sum())
+
+
+def generar_ventas(n_filas, semilla=0, inicio='2014-01-01', dias=1125, n_clientes=None):
+    """DataFrame tipado de ``n_filas`` líneas de venta sintéticas, ordenado por ``fecha``."""
+    generador = np.random.default_rng(semilla)
+    if n_clientes is None:
+        n_clientes = max(371, n_filas // 25)
+
+    ciudad = generador.integers(0, N_CIUDADES, n_filas)
+    departamento = ciudad % N_DEPARTAMENTOS
+    producto = _zipf(generador, N_PRODUCTOS, n_filas)
+    subgrupo = producto % N_SUBGRUPOS
+    cliente = _zipf(generador, n_clientes, n_filas, exponente=0.9)
+    vendedor = generador.integers(0, N_VENDEDORES, n_filas)
+    dia = np.sort(generador.integers(0, dias, n_filas))
+    fecha = (np.datetime64(inicio, 'D') + dia).astype('datetime64[ns]')
+    cantidad = np.round(generador.lognormal(4, 1.2, n_filas), 2)
+    precio = generador.lognormal(10, 1, N_PRODUCTOS)[producto]
+    pre_tot = np.round(cantidad * precio, 2)
+    centro = producto % len(CENTROS_COSTO)
+
+    def nombres(prefijo, indices):
+        return pd.Categorical.from_codes(indices, [f'{prefijo} {i}' for i in range(indices.max() + 1)])
+
+    df = pd.DataFrame({
+        'vendedor': vendedor + 1,
+        'nom_ven': nombres('VENDEDOR', vendedor),
+        # Una factura por cliente y día.
+        'num_doc': pd.array([f'FM-{n}' for n in dia * n_clientes + cliente], dtype='string'),
+        'fecha': fecha,
+        'dia_pla': generador.choice([0, 30, 45, 60, 75, 90], n_filas),
+        'item': nombres('ITEM', producto),
+        'des_item': nombres('PRODUCTO', producto),
+        'cantidad': cantidad,
+        'pre_tot': pre_tot,
+        'cliente': pd.Categorical.from_codes(cliente, [str(800000000 + i) for i in range(cliente.max() + 1)]),
+        'nom_cli': nombres('CLIENTE', cliente),
+        'cod_subgrupo': subgrupo + 1,
+        'nom_sub': nombres('SUBGRUPO', subgrupo),
+        'cod_dep': departamento + 5,
+        'departamento': nombres('DEPARTAMENTO', departamento),
+        'cod_ciu': (departamento + 5) * 1000 + ciudad,
+        'ciudad': nombres('CIUDAD', ciudad),
+        'cod_cco': centro + 1,
+        'nom_cco': pd.Categorical.from_codes(centro, CENTROS_COSTO),
+    })
+    return tipar_ventas(df)
@@ -1,24 +1,56 @@
 import streamlit as st
 import pandas as pd
-import math
-from pathlib import Path
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+from dashboard.cache import MB_FIGURAS, MB_RESULTADOS, CacheLRU
+from dashboard.carga import cargar_ventas, derivado, estado_carga, version_de
+from dashboard.catalogo import huella_seleccion
+from dashboard.exportar import FORMATOS, archivo_exportado
+from dashboard.figuras import (clave_figura, etiqueta_ventas, figura_evolucion, figura_pareto_clientes,
+                                figura_top_productos, figura_top_subgrupos)
+from dashboard.instrumentacion import Perfilador, tabla_rendimiento
+from dashboard.monedas import NOMBRES_MONEDAS, medida_en
+from dashboard.instantanea import preparacion_lista, preparar_en_segundo_plano
+from dashboard.pareto import AnalisisPareto
+from dashboard.pronostico import pronosticos_en_segundo_plano
 
 # Set the title and favicon that appear in the Browser's tab bar.
 st.set_page_config(page_title="Dashboard",
                    layout="wide",
                    page_icon="📊")
 
-google_drive_url = f'https://drive.google.com/uc?export=download&id={"1ovtCh5Q45nukxt9HILW3qzwTCmgSqNW2"}'
-df_url = pd.read_csv(google_drive_url)
-df = pd.DataFrame(df_url)
-df['fecha'] = pd.to_datetime(df['fecha'])
-
-ventas_año = df.groupby(pd.Grouper(key='fecha', freq='YE'))['pre_tot'].sum().reset_index()
-ventas_año['fecha'] = ventas_año['fecha'].dt.strftime('%Y')
-ventas_mes = df.groupby(pd.Grouper(key='fecha', freq='ME'))['pre_tot'].sum().reset_index()
+# Medición de cada etapa del script (panel de rendimiento en la barra lateral)
+perfilador = Perfilador(memoria=st.session_state.get('medir_memoria', False))
+
+# Mientras el proceso prepara los datos (primer arranque o datos nuevos) se
+# muestra un esqueleto de la página (con la misma versión que usa la preparación)
+esqueleto = st.empty()
+carga_previa = estado_carga()
+if carga_previa is None or not preparacion_lista(carga_previa['version']):
+    with esqueleto.container():
+        st.title('📊 Dashboard de Ventas y Análisis de Datos')
+        st.info('Preparando los datos del dashboard…')
+        for columna, etiqueta in zip(st.columns(4), ['Ventas Totales en Pesos', 'Ventas Totales en Dolares',
+                                                    'Clientes Únicos', 'Productos Vendidos']):
+            columna.metric(etiqueta, '—')
+
+# Descarga una vez por proceso (con TTL) y usa el CSV local si no hay conexión;
+# tras reiniciar, la tabla tipada se lee de la instantánea en disco
+perfilador.etapa('carga')
+df = cargar_ventas()
+perfilador.etapa('preparacion')
+version_datos = version_de(df) or id(df)
+# Motor de consultas (DASHBOARD_MOTOR) y catálogo de los filtros, armados en
+# segundo plano a partir de la instantánea (DASHBOARD_INSTANTANEAS)
+motor, catalogo = preparar_en_segundo_plano(df, version_datos).result()
+esqueleto.empty()
+# Pronóstico mensual por subgrupo: se ajusta en segundo plano una vez por versión de los datos
+futuro_pronostico = pronosticos_en_segundo_plano(df, version_datos)
+# Resultados y figuras por firma del filtro, compartidos por todas las sesiones
+# y limitados en bytes (DASHBOARD_CACHE_MB y DASHBOARD_CACHE_FIGURAS_MB)
+cache_resultados = derivado(df, 'cache_resultados',
+                            lambda _: CacheLRU(max_entradas=512, max_bytes=int(MB_RESULTADOS * 2**20)))
+cache_figuras = derivado(df, 'cache_figuras',
+                         lambda _: CacheLRU(max_entradas=512, max_bytes=int(MB_FIGURAS * 2**20)))
 
 # -----------------------------------------------------------------------------
 # Declare some useful functions.
@@ -29,6 +61,14 @@ ventas_mes = df.groupby(pd.Grouper(key='fecha', freq='ME'))['pre_tot'].sum().res
 # Set the title that appears at the top of the page.
 st.title('📊 Dashboard de Ventas y Análisis de Datos')
 st.info('Para abrir el panel de control de filtros haga click en el botón (») en la parte superior izquierda')
+# Si la última revalidación falló se siguen mostrando los datos ya cargados
+error_carga = (estado_carga() or {}).get('error')
+if error_carga:
+    st.warning(f'No se pudieron actualizar los datos ({error_carga}); se muestran los últimos cargados.')
+# Ventas posteriores a la tabla de la TRM: se convierten con la última tasa publicada
+if len(df) and df['fecha'].iloc[-1] > motor.trm.hasta:
+    st.warning(f'La TRM disponible llega hasta el {motor.trm.hasta:%Y-%m-%d}; las ventas posteriores '
+               'se convierten a otras monedas con la tasa de ese día.')
 st.title('¿Cómo han evolucionado las ventas en el tiempo?')
 
 
@@ -36,6 +76,7 @@ st.title('¿Cómo han evolucionado las ventas en el tiempo?')
 ''
 ''
 # Configuración de la barra lateral
+perfilador.etapa('barra_lateral')
 st.sidebar.title('Panel de control de filtros')
 
 # Estado de sesión para los filtros
@@ -60,35 +101,26 @@ def reset_filters():
 # Botón de reinicio filtros
 st.sidebar.button(' Restablecer Filtros', on_click=reset_filters)
 
-# 4. Selector de agrupación para gráfico ventas
-st.sidebar.header('Configuración del gráfico')
-agrupacion_tiempo = st.sidebar.radio(
-    'Agrupación de tiempo:',
-    ['Dia', 'Semanal', 'Mensual', 'Trimestral', 'Anual'],
-    index=2, # 'Mensual' es la tercera opción (índice 2)
-    key=f'agrupacion_{st.session_state.agrupacion_key}'
-)
-
 # 1. Selector de fechas
 st.sidebar.header('Rango de fechas')
 fecha_inicio = st.sidebar.date_input(
     'Fecha inicial',
-    value=pd.to_datetime('2014-01-10'),
-    min_value=pd.to_datetime('2014-01-10'),
-    max_value=pd.to_datetime('2017-01-30'),
+    value=catalogo.fecha_min,
+    min_value=catalogo.fecha_min,
+    max_value=catalogo.fecha_max,
     key=f'fecha_inicio_{st.session_state.fecha_inicio_key}'
 )
 fecha_final = st.sidebar.date_input(
     'Fecha final',
-    value=pd.to_datetime('2017-01-30'),
-    min_value=pd.to_datetime('2014-01-10'),
-    max_value=pd.to_datetime('2017-01-30'),
+    value=catalogo.fecha_max,
+    min_value=catalogo.fecha_min,
+    max_value=catalogo.fecha_max,
     key=f'fecha_fin_{st.session_state.fecha_fin_key}'
 )
 
 # Filtro Departamento
 st.sidebar.header('Filtro geográfico')
-departamentos = df['departamento'].unique().tolist()
+departamentos = catalogo.dominios['departamento']
 departamentos_seleccionados = st.sidebar.multiselect(
     'Selecciona deparamentost:',
     options=departamentos,
@@ -96,19 +128,20 @@ departamentos_seleccionados = st.sidebar.multiselect(
     key=f'departamento_{st.session_state.departamento_key}'
 )
 
-# 2. Filtro ciudad
+# 2. Filtro ciudad: solo las ciudades de los departamentos elegidos. La clave
+# cambia con esa selección para que el widget vuelva a marcar todas sus ciudades.
 #st.sidebar.header('Filtro de ciudades')
-ciudades = df['ciudad'].unique().tolist()
+ciudades = catalogo.ciudades(departamentos_seleccionados)
 ciudades_seleccionadas = st.sidebar.multiselect(
     'Selecciona ciudades:',
     options=ciudades,
     default=ciudades, # Todos por defecto
-    key=f'ciudad_{st.session_state.ciudad_key}'
+    key=f'ciudad_{st.session_state.ciudad_key}_{huella_seleccion(departamentos_seleccionados)}'
 )
 
 # 3. Filtro subgrupo
 st.sidebar.header('Filtro de subgrupos')
-subgrupos = df['nom_sub'].unique().tolist()
+subgrupos = catalogo.dominios['nom_sub']
 subgrupos_seleccionados = st.sidebar.multiselect(
     'Selecciona el subgrupo:',
     options=subgrupos,
@@ -116,6 +149,25 @@ subgrupos_seleccionados = st.sidebar.multiselect(
     key=f'subgrupo_{st.session_state.subgrupo_key}'
 )
 
+# 4. Moneda de gráficos y tablas: la TRM se une por fecha solo al elegir otra moneda
+st.sidebar.header('Moneda')
+moneda = st.sidebar.radio('Moneda de los valores', options=motor.trm.monedas,
+                          format_func=lambda m: f'{NOMBRES_MONEDAS.get(m, m)} ({m})', horizontal=True,
+                          key='moneda')
+medida = medida_en(moneda)
+
+# Formato de los archivos descargables
+st.sidebar.header('Exportación')
+formato_exportacion = st.sidebar.radio('Formato de exportación', options=list(FORMATOS), horizontal=True,
+                                       key='formato_exportacion')
+extension, mime_exportacion = FORMATOS[formato_exportacion]
+
+
+def boton_exportar(etiqueta, nombre, obtener_bloques, key):
+    """Botón de descarga; el archivo se escribe por bloques solo al hacer clic."""
+    st.download_button(etiqueta, data=lambda: archivo_exportado(obtener_bloques(), formato_exportacion),
+                       file_name=f'{nombre}.{extension}', mime=mime_exportacion, on_click='ignore', key=key)
+
 # Fecha inicio debe ser mayor a fecha final
 if fecha_inicio > fecha_final:
     st.sidebar.error('La fecha inicial no puede ser mayor que la fecha final.')
@@ -137,43 +189,34 @@ if not subgrupos_seleccionados:
     st.stop()
 
 # Aplicar filtros al DataFrame
-df_filtrado = df[
-    (df['departamento'].isin(departamentos_seleccionados)) &
-    (df['ciudad'].isin(ciudades_seleccionadas)) &
-    (df['nom_sub'].isin(subgrupos_seleccionados)) &
-    (df['fecha'] >= pd.to_datetime(fecha_inicio)) &
-    (df['fecha'] <= pd.to_datetime(fecha_final))
-]
+perfilador.etapa('filtro')
+seleccion = {
+    'departamento': departamentos_seleccionados,
+    'ciudad': ciudades_seleccionadas,
+    'nom_sub': subgrupos_seleccionados,
+}
+filtro = (seleccion, fecha_inicio, fecha_final)
+firma_filtro = motor.firma(filtro)
 
 # Metricas claves
+perfilador.etapa('indicadores')
+indicadores = cache_resultados.obtener(('indicadores', firma_filtro), lambda: motor.indicadores(filtro))
+# Los distintos estimados con los bocetos se marcan como aproximados
+aprox = '≈ ' if indicadores['distintos_aproximados'] else ''
 col1, col2 = st.columns(2)
 with col1:
-    st.metric('Ventas Totales en Pesos', f'${df_filtrado["pre_tot"].sum():,.0f}')
+    st.metric('Ventas Totales en Pesos', f'${indicadores["ventas_pesos"]:,.0f}')
 with col2:
-    st.metric('Ventas Totales en Dolares', f'${df_filtrado["pre_tot_US"].sum():,.0f}')
+    st.metric('Ventas Totales en Dolares', f'${indicadores["ventas_dolares"]:,.0f}')
 
 col1, col2 = st.columns(2)
 with col1:
-    st.metric('Clientes Únicos', df_filtrado['cliente'].nunique())
+    st.metric('Clientes Únicos', f"{aprox}{indicadores['clientes_unicos']}")
 with col2:
-    st.metric('Productos Vendidos', df_filtrado['item'].nunique())
-
-# Logica agrupar segun eleccion
-if agrupacion_tiempo == 'Dia':
-    df_agrupado = df_filtrado.groupby(pd.Grouper(key='fecha', freq='D'))['pre_tot'].sum().reset_index()
-    titulo_grafico = 'Evolución de Ventas Diarias'
-elif agrupacion_tiempo == 'Semanal':
-    df_agrupado = df_filtrado.groupby(pd.Grouper(key='fecha', freq='W'))['pre_tot'].sum().reset_index()
-    titulo_grafico = 'Evolución de Ventas Semanales'
-elif agrupacion_tiempo == 'Mensual':
-    df_agrupado = df_filtrado.groupby(pd.Grouper(key='fecha', freq='ME'))['pre_tot'].sum().reset_index()
-    titulo_grafico = 'Evolución de Ventas Mensuales'
-elif agrupacion_tiempo == 'Trimestral':
-    df_agrupado = df_filtrado.groupby(pd.Grouper(key='fecha', freq='Q'))['pre_tot'].sum().reset_index()
-    titulo_grafico = 'Evolución de Ventas Trimestrales'
-else: # Anual
-    df_agrupado = df_filtrado.groupby(pd.Grouper(key='fecha', freq='Y'))['pre_tot'].sum().reset_index()
-    titulo_grafico = 'Evolución de Ventas Anuales'
+    st.metric('Productos Vendidos', f"{aprox}{indicadores['productos_vendidos']}")
+
+boton_exportar('Descargar ventas filtradas', 'ventas_filtradas', lambda: motor.bloques(filtro, medida=medida),
+               'exportar_ventas')
 
 # st.dataframe(df)
 
@@ -207,143 +250,69 @@ def formato_miles_millones(value, tick_number):
     new_value = value / 1000000
     return f'{new_value:,.0f} M'.replace(',', 'X').replace('.', ',').replace('X', '.')
 
-fig = go.Figure()
-
-if agrupacion_tiempo == 'Semanal':
-    fechas = df_agrupado['fecha']
-    etiquetas_personalizadas = []
-    for fecha in fechas:
-        # Calcular el rango de días de la semana
-        inicio_semana = fecha - pd.Timedelta(days=fecha.weekday())
-        fin_semana = inicio_semana + pd.Timedelta(days=6)
-        # Ajustar si el inicio o fin de semana se sale del mes
-        inicio_semana = max(inicio_semana, pd.Timestamp(fecha.year, fecha.month, 1))
-        fin_mes = pd.Timestamp(fecha.year, fecha.month, 1) + pd.offsets.MonthEnd(0)
-        fin_semana = min(fin_semana, fin_mes)
-        etiqueta = f"{inicio_semana.month}/{inicio_semana.day} - {fin_semana.month}/{fin_semana.day}"
-        etiquetas_personalizadas.append(etiqueta)
-    fig.update_layout(
-        xaxis_title='Semana',
-        yaxis_title='Ventas Totales (Pesos)',
-        title=titulo_grafico
-    )
-    fig.update_xaxes(
-        tickvals=fechas,
-        ticktext=etiquetas_personalizadas
-    )
-elif agrupacion_tiempo == 'Mensual':
-    fechas = pd.date_range(start=df_agrupado['fecha'].min(), end=df_agrupado['fecha'].max(), freq='M')
-    fig.update_layout(
-    xaxis_title='Fecha', 
-    yaxis_title='Ventas Totales (Pesos)',
-    title=titulo_grafico
-    )
-    meses_español = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-    fechas = df_agrupado['fecha']
-    etiquetas_personalizadas = []
-    mostrar_año = []
-    for fecha in df_agrupado['fecha']:
-        nombre_mes = meses_español[fecha.month - 1]
-        etiquetas_personalizadas.append(nombre_mes)
-        if fecha.month == 1:  # Si es enero, mostrar el año
-            mostrar_año.append(str(fecha.year))
-        else:
-            mostrar_año.append('')
-    # fig.update_xaxes(title_text='Mes (Los años se indican sobre el punto de Enero)')
-    for i, fecha in enumerate(fechas):
-        if fecha.month == 1:  # Si es enero, añadir anotación del año
-            fig.add_annotation(
-                x=fecha,
-                y=0,
-                yref="paper",
-                text=str(fecha.year),
-                showarrow=False,
-                yshift=-50,
-                font=dict(size=13)
-            )
-    fig.update_xaxes(
-        tickvals=fechas,
-        ticktext=etiquetas_personalizadas
+def perfilador_seccion(perfilador):
+    """Perfilador de una sección y si es propio (re-ejecución solo del fragmento) y hay que finalizarlo."""
+    if perfilador.finalizado:
+        return Perfilador(memoria=perfilador.memoria), True
+    return perfilador, False
+
+
+def pronostico_del_filtro(filtro, agrupacion_tiempo, medida):
+    """Pronóstico ya calculado para el gráfico, o ``None`` si no aplica o aún no está listo.
+
+    Los modelos son de todo el país por subgrupo y en pesos, así que solo se
+    superponen en la vista mensual en pesos, sin filtro geográfico y con el
+    rango hasta el final de los datos.
+    """
+    seleccion, _, fecha_final = filtro
+    if (agrupacion_tiempo != 'Mensual' or medida != 'pre_tot'
+            or not futuro_pronostico.done() or futuro_pronostico.exception()):
+        return None
+    pronosticos = futuro_pronostico.result()
+    geografia_completa = (len(seleccion['departamento']) == len(catalogo.dominios['departamento'])
+                          and len(seleccion['ciudad']) == len(catalogo.dominios['ciudad']))
+    if not geografia_completa or pd.Timestamp(fecha_final) < pronosticos.fin_datos.normalize():
+        return None
+    subgrupos = seleccion['nom_sub']
+    return pronosticos.para(None if len(subgrupos) == len(catalogo.dominios['nom_sub']) else subgrupos)
+
+
+# Las secciones con widgets propios son fragmentos: al mover su widget solo se
+# re-ejecuta la sección, con las entradas que recibe como argumentos (las de la
+# última ejecución completa). Cambiar un filtro re-ejecuta todo el script.
+@st.fragment
+def seccion_evolucion(filtro, firma_filtro, medida, perfilador):
+    """Gráfico de evolución; depende del filtro y de la agrupación de tiempo."""
+    perfilador, parcial = perfilador_seccion(perfilador)
+    # 4. Selector de agrupación para gráfico ventas
+    agrupacion_tiempo = st.radio(
+        'Agrupación de tiempo:',
+        ['Dia', 'Semanal', 'Mensual', 'Trimestral', 'Anual'],
+        index=2, # 'Mensual' es la tercera opción (índice 2)
+        horizontal=True,
+        key=f'agrupacion_{st.session_state.agrupacion_key}'
     )
 
-elif agrupacion_tiempo == 'Trimestral':
-    trimestres = ['Tri 1', 'Tri 2', 'Tri 3', 'Tri 4']
-    fechas = df_agrupado['fecha']
-    etiquetas_personalizadas = []
-    mostrar_año = []
-    for fecha in df_agrupado['fecha']:
-        nombre_tri = trimestres[fecha.quarter-1]
-        etiquetas_personalizadas.append(nombre_tri)
-    if fecha.quarter == 1:  # Si es el primer mes del trimestre, mostrar el año 
-        mostrar_año.append(str(fecha.year))
-    else:
-        mostrar_año.append('')
-    
-    for i, fecha in enumerate(fechas):
-        if fecha.quarter == 1:  # Si es el primer mes del trimestre, añadir anotación del año
-            fig.add_annotation(
-                x=fecha,
-                y=0,
-                yref="paper",
-                text=str(fecha.year),
-                showarrow=False,
-                yshift=-50,
-                font=dict(size=13)
-            )
-    fig.update_layout(
-        yaxis=dict(
-            tickformat=',.0f',
-            tickmode='array'
-        ),
-        xaxis = dict(
-            tickmode='array',
-            tickvals=fechas,
-            ticktext=etiquetas_personalizadas
-        ),
-        xaxis_title='Fecha', 
-        yaxis_title='Ventas Totales (Pesos)',
-        title=titulo_grafico
-    )
-    fig.update_xaxes(
-        tickvals=fechas,
-        ticktext=etiquetas_personalizadas
-    )
-else:  # Anual
-    fechas = df_agrupado['fecha']
-    etiquetas_personalizadas = [f'{fecha.year}' for fecha in fechas]
-    for i, fecha in enumerate(fechas):
-        fig.add_annotation(
-                x=fecha,
-                y=0,
-                yref="paper",
-                text=str(fecha.year),
-                showarrow=False,
-                yshift=-50,
-                font=dict(size=13)
-            )
-    fig.update_layout(
-        xaxis = dict(
-            tickmode='array',
-            tickvals=fechas,
-            ticktext=etiquetas_personalizadas
-        ),
-        xaxis_title='Fecha', 
-        yaxis_title='Ventas Totales (Pesos)',
-        title=titulo_grafico
-    )
-    fig.update_xaxes(
-        tickvals=[],
-        ticktext=etiquetas_personalizadas
+    # Logica agrupar segun eleccion (en el motor: cubo diario o SQL, no sobre las líneas de venta).
+    # La figura se reutiliza mientras no cambien el filtro ni la agrupación.
+    perfilador.etapa('evolucion')
+    pronostico = pronostico_del_filtro(filtro, agrupacion_tiempo, medida)
+    nombre_figura = 'evolucion' if pronostico is None else 'evolucion_pronostico'
+    fig = cache_figuras.obtener(
+        clave_figura(nombre_figura, firma_filtro, agrupacion_tiempo, medida),
+        lambda: figura_evolucion(motor.serie_temporal(filtro, agrupacion_tiempo, medida), agrupacion_tiempo,
+                                 medida, pronostico)
     )
 
-fig.add_trace(go.Scatter(
-    x=fechas,
-    y=df_agrupado['pre_tot'],
-    mode='lines')
-)
+    perfilador.etapa('grafico_evolucion')
+    st.plotly_chart(fig, use_container_width=True)
+    if agrupacion_tiempo == 'Mensual' and medida == 'pre_tot' and not futuro_pronostico.done():
+        st.caption('Calculando el pronóstico por subgrupo; aparecerá al actualizar el gráfico.')
+    if parcial:
+        perfilador.finalizar()
 
 
-st.plotly_chart(fig, use_container_width=True)
+seccion_evolucion(filtro, firma_filtro, medida, perfilador)
 
 
 # st.line_chart(df_agrupado, 
@@ -361,76 +330,26 @@ st.title('¿Cuáles son los productos y subgrupos más rentables?')
 
 st.subheader('Productos y subgrupos que más venden')
 
-df_agrupado = df_filtrado.groupby(['nom_sub', 'des_item'])['pre_tot'].sum().reset_index()
-df_agrupado = df_agrupado.sort_values(by='pre_tot', ascending=True).head(10)
-
-df_agrupado['Porcentaje_Acumulado'] = df_agrupado['pre_tot'].cumsum() / df_agrupado['pre_tot'].sum() * 100
-df_agrupado['Porcentaje_Del_Total'] = df_agrupado['pre_tot'] / df_agrupado['pre_tot'].sum() * 100
-
-df_subgrupo = df_filtrado.groupby(['nom_sub'])['pre_tot'].sum().reset_index()
-df_subgrupo = df_subgrupo.sort_values(by='pre_tot', ascending=True)
-df_subgrupo['Porcentaje_Acumulado'] = df_subgrupo['pre_tot'].cumsum() / df_subgrupo['pre_tot'].sum() * 100
-
-df_top_subgrupo = df_subgrupo.tail(10)
-
-fig_subgrupo = make_subplots(specs=[[{"secondary_y": True}]])
-fig_subgrupo.add_trace(
-    go.Bar(
-        y=df_top_subgrupo['nom_sub'],
-        x=df_top_subgrupo['pre_tot'],
-        name='Ventas Totales (Pesos)',
-        marker_color='indianred',
-        orientation='h',
-    ),
-    secondary_y=False,
-)
-
-fig_subgrupo.update_layout(
-    title_text='Top 10 Subgrupos por Ventas Totales',
-    height=600,
+perfilador.etapa('top_10')
+df_subgrupo = cache_resultados.obtener(
+    ('subgrupos', firma_filtro, medida),
+    lambda: motor.totales_por(filtro, ['nom_sub'], medida).sort_values(by=medida, ascending=True)
 )
-fig_subgrupo.update_xaxes(title_text='Ventas Totales (Pesos)', tickangle=0)
-fig_subgrupo.update_yaxes(
-    title_text='Subgrupo', 
-    secondary_y=False,
-    tickformat=',.0f'
+df_productos = cache_resultados.obtener(
+    ('productos', firma_filtro, medida),
+    lambda: motor.totales_por(filtro, ['nom_sub', 'des_item'], medida).sort_values(by=medida, ascending=True)
 )
-fig_subgrupo.update_yaxes(
-    title_text='Porcentaje Acumulado (%)',
-    secondary_y=True,
-    # tickformat='%',
-    range=[0, 110]
-)
-
-
-
-
-df_productos = df.groupby(['nom_sub','des_item'])['pre_tot'].sum().reset_index()
-df_productos = df_productos.sort_values(by='pre_tot', ascending=True)
-
-df_productos = df_filtrado.groupby(['nom_sub','des_item'])['pre_tot'].sum().reset_index()
-df_productos = df_productos.sort_values(by='pre_tot', ascending=True)
 
-df_top_productos = df_productos.tail(10)
-
-fig_productos = make_subplots(specs=[[{"secondary_y": True}]])
-fig_productos.add_trace(
-    go.Bar(
-        y=df_top_productos['des_item'],
-        x=df_top_productos['pre_tot'],
-        name='Ventas Totales (Pesos)',
-        marker_color='lightsalmon',
-        orientation='h',
-    ),
-    secondary_y=False,
+fig_subgrupo = cache_figuras.obtener(
+    clave_figura('top_subgrupos', firma_filtro, moneda=medida),
+    lambda: figura_top_subgrupos(df_subgrupo, medida)
 )
-fig_productos.update_layout(
-    title_text='Top 10 Productos por Ventas Totales',
-    height=600,
+fig_productos = cache_figuras.obtener(
+    clave_figura('top_productos', firma_filtro, moneda=medida),
+    lambda: figura_top_productos(df_productos, medida)
 )
-fig_productos.update_yaxes(title_text='Producto', secondary_y=False)
-fig_productos.update_xaxes(title_text='Ventas Totales (Pesos)')
 
+perfilador.etapa('graficos_top_10')
 col1, col2 = st.columns(2)
 with col1:
     st.plotly_chart(fig_subgrupo, use_container_width=True)
@@ -440,69 +359,61 @@ with col2:
 
 st.subheader('Análisis de Pareto')
 
-df_subgrupo = df_subgrupo.sort_values(by='pre_tot', ascending=False)
-total_ventas = df_subgrupo['pre_tot'].sum()
-ventas_acumuladas = 0
-subgrupos_80 = 0
-
-for i, row in df_subgrupo.iterrows():
-    ventas_acumuladas += row['pre_tot']
-    if ventas_acumuladas / total_ventas <= 0.8:
-        subgrupos_80 += 1
-    else:
-        break
-
-st.info(f"""
-        **Principio de Pareto (Regla 80/20):**
-        - {subgrupos_80} de los {len(df_subgrupo)} subgrupos de productos ({(subgrupos_80/len(df_subgrupo))*100:.1f}%)
-          generan aproximadamente el 80% de las ventas totales.
-        - El resto de subgrupos ({len(df_subgrupo)-subgrupos_80} productos) generan solo el 20% de las ventas.
-        """)
-
-df_productos = df_productos.sort_values(by='pre_tot', ascending=False)
-ventas_totales = df_productos['pre_tot'].sum()
-ventas_acumuladas = 0
-productos_80 = 0
-
-for i, row in df_productos.iterrows():
-    ventas_acumuladas += row['pre_tot']
-    if ventas_acumuladas / ventas_totales <= 0.8:
-        productos_80 += 1
-    else:
-        break
-
-st.info(f"""
-        **Principio de Pareto (Regla 80/20):**
-        - {productos_80} de los {len(df_productos)} productos ({(productos_80/len(df_productos))*100:.1f}%)
-          generan aproximadamente el 80% de las ventas totales.
-        - El resto de productos ({len(df_productos)-productos_80} productos) generan solo el 20% de las ventas.
-        """)
-
-st.subheader('Tabla de Productos que generan el 80% de las ventas')
-
-
-ventas_acumuladas = 0
-productos_top = []
-for i, row in df_productos.iterrows():
-    ventas_acumuladas += row['pre_tot']
-    porcentaje_acumulado = (ventas_acumuladas / ventas_totales) * 100
-    productos_top.append({
-        'Producto': row['des_item'],
-        'Subgrupo': row['nom_sub'],
-        'Ventas Totales (Pesos)': row['pre_tot'],
-        'Porcentaje del Total (%)': (row['pre_tot'] / ventas_totales) * 100,
-        'Porcentaje Acumulado (%)': porcentaje_acumulado
-    })
-
-    if porcentaje_acumulado >= 80:
-        break
-
-df_top_resumen = pd.DataFrame(productos_top)
-st.dataframe(df_top_resumen.style.format({
-    'Ventas Totales (Pesos)': '${:,.0f}',
-    'Porcentaje del Total (%)': '{:.1f}%',
-    'Porcentaje Acumulado (%)': '{:.1f}%'
-}))
+@st.fragment
+def seccion_pareto(df_subgrupo, df_productos, firma_filtro, medida, perfilador):
+    """Pareto de subgrupos y productos; depende del filtro y del umbral."""
+    perfilador, parcial = perfilador_seccion(perfilador)
+    # Un solo ordenamiento por tabla; cualquier umbral se resuelve sin recorrer filas
+    perfilador.etapa('pareto')
+    umbral_pareto = st.slider('Umbral de Pareto (%)', min_value=50, max_value=95, value=80, step=5)
+    pareto_subgrupos = cache_resultados.obtener(('pareto_subgrupos', firma_filtro, medida),
+                                                lambda: AnalisisPareto(df_subgrupo, valor=medida))
+    pareto_productos = cache_resultados.obtener(('pareto_productos', firma_filtro, medida),
+                                                lambda: AnalisisPareto(df_productos, valor=medida))
+    if not len(pareto_subgrupos) or not len(pareto_productos):
+        st.info('No hay ventas para los filtros seleccionados: no hay datos para el análisis de Pareto.')
+        if parcial:
+            perfilador.finalizar()
+        return
+
+    subgrupos_80 = pareto_subgrupos.cantidad_hasta(umbral_pareto)
+    st.info(f"""
+            **Principio de Pareto (Regla {umbral_pareto}/{100-umbral_pareto}):**
+            - {subgrupos_80} de los {len(pareto_subgrupos)} subgrupos de productos ({(subgrupos_80/len(pareto_subgrupos))*100:.1f}%)
+              generan aproximadamente el {umbral_pareto}% de las ventas totales.
+            - El resto de subgrupos ({len(pareto_subgrupos)-subgrupos_80} productos) generan solo el {100-umbral_pareto}% de las ventas.
+            """)
+
+    productos_80 = pareto_productos.cantidad_hasta(umbral_pareto)
+    st.info(f"""
+            **Principio de Pareto (Regla {umbral_pareto}/{100-umbral_pareto}):**
+            - {productos_80} de los {len(pareto_productos)} productos ({(productos_80/len(pareto_productos))*100:.1f}%)
+              generan aproximadamente el {umbral_pareto}% de las ventas totales.
+            - El resto de productos ({len(pareto_productos)-productos_80} productos) generan solo el {100-umbral_pareto}% de las ventas.
+            """)
+
+    st.subheader(f'Tabla de Productos que generan el {umbral_pareto}% de las ventas')
+
+    ventas_totales = etiqueta_ventas(medida)
+    df_top_resumen = pareto_productos.principales(umbral_pareto).rename(columns={
+        'des_item': 'Producto',
+        'nom_sub': 'Subgrupo',
+        medida: ventas_totales,
+        'porcentaje_del_total': 'Porcentaje del Total (%)',
+        'porcentaje_acumulado': 'Porcentaje Acumulado (%)',
+    })[['Producto', 'Subgrupo', ventas_totales, 'Porcentaje del Total (%)', 'Porcentaje Acumulado (%)']]
+    st.dataframe(df_top_resumen.style.format({
+        ventas_totales: '${:,.0f}',
+        'Porcentaje del Total (%)': '{:.1f}%',
+        'Porcentaje Acumulado (%)': '{:.1f}%'
+    }))
+    boton_exportar('Descargar tabla de productos', f'productos_pareto_{umbral_pareto}',
+                   lambda: [df_top_resumen], 'exportar_productos')
+    if parcial:
+        perfilador.finalizar()
+
+
+seccion_pareto(df_subgrupo, df_productos, firma_filtro, medida, perfilador)
 
 '''
 ## **Conclusiones del análisis de productos y subgrupos:**
@@ -515,114 +426,100 @@ Con esta información, se pueden tomar decisiones estratégicas como:
 # ------------------------------------------------------------------
 
 st.title('¿Quiénes son nuestros mejores clientes?')
-# --- Agrupar ventas por cliente ---
-df_clientes = df.groupby('nom_cli').agg({
-    'pre_tot': 'sum',
-    'num_doc': 'nunique',  # Número de compras (frecuencia)
-    'fecha': 'max'  # Última fecha de compra
-}).reset_index()
-
-df_clientes = df_clientes.rename(columns={
-    'pre_tot': 'ventas_totales',
-    'num_doc': 'frecuencia_compras',
-    'fecha': 'ultima_compra'
-})
-
-# Ordenar por ventas totales (de mayor a menor)
-df_clientes = df_clientes.sort_values('ventas_totales', ascending=False)
-
-# --- Calcular métricas para identificar el top 5% ---
-total_ventas = df_clientes['ventas_totales'].sum()
-df_clientes['porcentaje_del_total'] = (df_clientes['ventas_totales'] / total_ventas) * 100
-df_clientes['porcentaje_acumulado'] = df_clientes['porcentaje_del_total'].cumsum()
-
-# Identificar el top 5% de clientes por ingresos
-umbral_5_porciento = 30
-clientes_top_5 = df_clientes[df_clientes['porcentaje_acumulado'] <= umbral_5_porciento]
-
-# Alternativa: calcular percentil 95
-percentil_95 = df_clientes['ventas_totales'].quantile(0.70)
-clientes_top_5_alt = df_clientes[df_clientes['ventas_totales'] >= percentil_95]
-
-st.subheader(f"Top {len(clientes_top_5)} Clientes Más Valiosos (Generan el {umbral_5_porciento}% de Ingresos)")
-
-# --- Mostrar KPIs principales ---
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric("Total Clientes", len(df_clientes))
-with col2:
-    st.metric("Clientes Top 5%", len(clientes_top_5))
-with col3:
-    st.metric("% Ventas del Top 5%", f"{clientes_top_5['porcentaje_del_total'].sum():.1f}%")
-
-# --- Gráfico de Pareto de Clientes ---
-st.subheader("Análisis de Pareto - Distribución de Clientes por Valor")
-
-# Preparar datos para Pareto
-df_pareto = df_clientes.copy()
-df_pareto['cliente_rank'] = range(1, len(df_pareto) + 1)
-df_pareto['es_top_5'] = df_pareto['nom_cli'].isin(clientes_top_5['nom_cli'])
-
-# Crear gráfico de Pareto
-fig_pareto = go.Figure()
-
-# Barras para ventas por cliente
-fig_pareto.add_trace(go.Bar(
-    x=df_pareto['cliente_rank'],
-    y=df_pareto['ventas_totales'],
-    name='Ventas por Cliente',
-    marker_color=df_pareto['es_top_5'].map({True: 'red', False: 'lightblue'})
-))
-
-# Línea de porcentaje acumulado
-fig_pareto.add_trace(go.Scatter(
-    x=df_pareto['cliente_rank'],
-    y=df_pareto['porcentaje_acumulado'],
-    name='% Acumulado',
-    line=dict(color='orange', width=3),
-    yaxis='y2'
-))
-
-# Línea del 5%
-fig_pareto.add_trace(go.Scatter(
-    x=[0, len(df_pareto)],
-    y=[5, 5],
-    name='Umbral 5%',
-    line=dict(color='red', width=2, dash='dash'),
-    yaxis='y2'
-))
-
-fig_pareto.update_layout(
-    title='Distribución de Valor de Clientes - Principio de Pareto',
-    xaxis_title='Ranking de Clientes',
-    yaxis_title='Ventas Totales',
-    yaxis2=dict(
-        title='Porcentaje Acumulado (%)',
-        overlaying='y',
-        side='right',
-        range=[0, 100]
-    ),
-    showlegend=True
-)
 
-st.plotly_chart(fig_pareto, use_container_width=True)
-
-# --- Tabla de Clientes Top 5% ---
-st.subheader("Detalle de Clientes Más Valiosos")
-
-# Formatear la tabla para mejor visualización
-clientes_top_display = clientes_top_5.copy()
-clientes_top_display['ventas_totales'] = clientes_top_display['ventas_totales'].apply(lambda x: f"${x:,.0f}")
-clientes_top_display['porcentaje_del_total'] = clientes_top_display['porcentaje_del_total'].apply(lambda x: f"{x:.2f}%")
-clientes_top_display['ultima_compra'] = pd.to_datetime(clientes_top_display['ultima_compra']).dt.strftime('%Y-%m-%d')
-
-st.dataframe(
-    clientes_top_display[['nom_cli', 'ventas_totales', 'porcentaje_del_total', 'frecuencia_compras', 'ultima_compra']],
-    column_config={
-        'nom_cli': 'Cliente',
-        'ventas_totales': 'Ventas Totales',
-        'porcentaje_del_total': '% del Total',
-        'frecuencia_compras': 'N° Compras',
-        'ultima_compra': 'Última Compra'
-    }
-)
\ No newline at end of file
+
+# La sección queda bajo el pliegue: no se calcula hasta que se abre la primera
+# vez (el interruptor re-ejecuta solo el fragmento y queda abierto en la sesión).
+@st.fragment
+def seccion_clientes(filtro, firma_filtro, fecha_final, medida, perfilador):
+    """Análisis RFM de clientes; depende del filtro, la fecha final y la moneda."""
+    if not st.toggle('Mostrar análisis de clientes', key='mostrar_clientes'):
+        st.caption('Actívelo para calcular el valor, la frecuencia y la recencia de cada cliente.')
+        return
+    perfilador, parcial = perfilador_seccion(perfilador)
+    # --- Agrupar ventas por cliente (RFM sobre la selección actual, cacheado por filtro) ---
+    # Ordenado por ventas totales (de mayor a menor) con participación y porcentaje acumulado.
+    # La firma solo ve el rango de filas: la fecha final entra aparte porque fija la recencia.
+    perfilador.etapa('clientes')
+    pareto_clientes = cache_resultados.obtener(
+        ('clientes', firma_filtro, medida, pd.Timestamp(fecha_final)),
+        lambda: AnalisisPareto(motor.clientes(filtro, fecha_final, medida), valor='ventas_totales')
+    )
+    df_clientes = pareto_clientes.tabla
+
+    # Identificar el top 5% de clientes por ingresos
+    umbral_5_porciento = 30
+    clientes_top_5 = df_clientes.iloc[:pareto_clientes.cantidad_hasta(umbral_5_porciento)]
+
+    # Alternativa: calcular percentil 95
+    percentil_95 = df_clientes['ventas_totales'].quantile(0.70)
+    clientes_top_5_alt = df_clientes[df_clientes['ventas_totales'] >= percentil_95]
+
+    st.subheader(f"Top {len(clientes_top_5)} Clientes Más Valiosos (Generan el {umbral_5_porciento}% de Ingresos)")
+
+    # --- Mostrar KPIs principales ---
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Clientes", len(df_clientes))
+    with col2:
+        st.metric("Clientes Top 5%", len(clientes_top_5))
+    with col3:
+        st.metric("% Ventas del Top 5%", f"{clientes_top_5['porcentaje_del_total'].sum():.1f}%")
+
+    # --- Gráfico de Pareto de Clientes ---
+    st.subheader("Análisis de Pareto - Distribución de Clientes por Valor")
+
+    fig_pareto = cache_figuras.obtener(
+        clave_figura('pareto_clientes', firma_filtro, moneda=medida),
+        lambda: figura_pareto_clientes(df_clientes, len(clientes_top_5))
+    )
+
+    perfilador.etapa('grafico_clientes')
+    st.plotly_chart(fig_pareto, use_container_width=True)
+
+    # --- Tabla de Clientes Top 5% ---
+    st.subheader("Detalle de Clientes Más Valiosos")
+
+    # Formatear la tabla para mejor visualización
+    perfilador.etapa('tabla_clientes')
+    clientes_top_display = clientes_top_5.copy()
+    clientes_top_display['ventas_totales'] = clientes_top_display['ventas_totales'].apply(lambda x: f"${x:,.0f}")
+    clientes_top_display['porcentaje_del_total'] = clientes_top_display['porcentaje_del_total'].apply(lambda x: f"{x:.2f}%")
+    clientes_top_display['ultima_compra'] = pd.to_datetime(clientes_top_display['ultima_compra']).dt.strftime('%Y-%m-%d')
+
+    st.dataframe(
+        clientes_top_display[['nom_cli', 'ventas_totales', 'porcentaje_del_total', 'frecuencia_compras', 'ultima_compra',
+                              'recencia_dias']],
+        column_config={
+            'nom_cli': 'Cliente',
+            'ventas_totales': 'Ventas Totales',
+            'porcentaje_del_total': '% del Total',
+            'frecuencia_compras': 'N° Compras',
+            'ultima_compra': 'Última Compra',
+            'recencia_dias': 'Días sin Comprar'
+        }
+    )
+    boton_exportar('Descargar clientes más valiosos', 'clientes_top',
+                   lambda: [clientes_top_5.reset_index(drop=True)], 'exportar_clientes')
+    if parcial:
+        perfilador.finalizar()
+
+
+seccion_clientes(filtro, firma_filtro, fecha_final, medida, perfilador)
+
+# --- Panel de rendimiento ---
+registro = perfilador.finalizar()
+st.sidebar.header('Rendimiento')
+if st.sidebar.toggle('Mostrar panel de rendimiento', key='panel_rendimiento'):
+    st.sidebar.checkbox('Medir memoria por etapa', key='medir_memoria',
+                        help='Pico de memoria de todo el proceso durante cada etapa (tracemalloc), '
+                             'incluidas las demás sesiones. Hace más lentas las ejecuciones mientras está activo.')
+    st.sidebar.caption(f"Última ejecución: {registro['total_segundos'] * 1000:,.0f} ms")
+    st.sidebar.dataframe(tabla_rendimiento(registro), use_container_width=True)
+    for nombre, cache in (('resultados', cache_resultados), ('figuras', cache_figuras)):
+        stats = cache.estadisticas()
+        st.sidebar.caption(
+            f"Caché de {nombre}: {stats['tasa_aciertos']:.0%} de aciertos · "
+            f"{stats['entradas']} entradas · {stats['bytes'] / 2**20:,.1f} de "
+            f"{stats['max_bytes'] / 2**20:,.0f} MB · {stats['desalojos']} desalojos"
+        )
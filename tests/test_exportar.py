@@ -0,0 +1,39 @@
+"""Las descargas pasan por el conversor de ``st.download_button`` en todos los formatos."""
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from dashboard.almacenamiento import leer_csv
+from dashboard.exportar import FORMATOS, archivo_exportado
+from dashboard.motores import MotorPandas
+
+LECTORES = {
+    'CSV': lambda datos: pacsv.read_csv(io.BytesIO(datos)),
+    'Parquet': lambda datos: pq.read_table(io.BytesIO(datos)),
+    'Arrow IPC': lambda datos: pa.ipc.open_file(io.BytesIO(datos)).read_all(),
+}
+
+
+@pytest.fixture(scope='module')
+def motor():
+    return MotorPandas(leer_csv('ventas_industria_quimica.csv'))
+
+
+@pytest.mark.parametrize('formato', FORMATOS)
+def test_descarga_aceptada_por_streamlit(motor, formato):
+    filtro = ({'departamento': ['ANTIOQUIA']}, None, None)
+    archivo = archivo_exportado(motor.bloques(filtro, tam_bloque=1000), formato)
+    datos, _ = convert_data_to_bytes_and_infer_mime(archivo, TypeError('no soportado'))
+    archivo.close()
+    assert LECTORES[formato](datos).num_rows == len(motor.filas(filtro))
+
+
+def test_seleccion_vacia_conserva_columnas(motor):
+    archivo = archivo_exportado(motor.bloques(({'ciudad': []}, None, None)), 'Parquet')
+    datos, _ = convert_data_to_bytes_and_infer_mime(archivo, TypeError('no soportado'))
+    tabla = pq.read_table(io.BytesIO(datos))
+    assert tabla.num_rows == 0 and 'pre_tot' in tabla.column_names
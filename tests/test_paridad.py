@@ -0,0 +1,29 @@
+"""El motor DuckDB responde las consultas del dashboard igual que el de pandas."""
+import pytest
+
+pytest.importorskip('duckdb')
+
+from dashboard.almacenamiento import leer_csv
+from dashboard.motores import MotorDuckDB, MotorPandas, _filtros_de_prueba, verificar_paridad
+
+RUTA = 'ventas_industria_quimica.csv'
+VENTAS = leer_csv(RUTA)
+FILTROS = _filtros_de_prueba(VENTAS)
+
+
+@pytest.fixture(scope='module')
+def referencia():
+    # Los indicadores se comparan exactos, sin bocetos aproximados.
+    motor = MotorPandas(VENTAS)
+    motor.bocetos = None
+    return motor
+
+
+@pytest.fixture(scope='module', params=['archivo', 'dataframe'])
+def motor_duckdb(request):
+    return MotorDuckDB(RUTA if request.param == 'archivo' else VENTAS)
+
+
+@pytest.mark.parametrize('nombre', FILTROS)
+def test_paridad(referencia, motor_duckdb, nombre):
+    assert verificar_paridad(referencia, motor_duckdb, {nombre: FILTROS[nombre]}) == []